@@ -0,0 +1,100 @@
+import os
+import re
+import sys
+import time
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+
+try:
+    from chatbot_tools.metrics import metrics
+except ImportError:
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+    from chatbot_tools.metrics import metrics
+
+_NON_WORD_RE = re.compile(r"[^\w]+")
+# Contact details make an answer personal (and the model extracts them into the output)
+_PERSONAL_RE = re.compile(r"@|\d{3,}")
+CONTACT_FIELDS = ("forname", "surname", "email", "phone")
+
+
+def normalize_message(message):
+    """Lower-case, without diacritics and punctuation: "Koľko stojí?" -> "kolko stoji"."""
+    text = unicodedata.normalize("NFKD", message.lower())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return _NON_WORD_RE.sub(" ", text).strip()
+
+
+class AnswerCache:
+    """
+    Tony's replies to repeated opening questions ("koľko stojí", "what do you do").
+
+    Keyed by normalized message, language and prompt version, so editing the prompt
+    invalidates every entry. In-memory LRU with a TTL. Only context-free turns are
+    eligible: the first message of a conversation, without contact details, whose
+    answer had a cacheable intention and extracted no contact fields.
+    Hits, misses and skips are counted in `tony_answer_cache_total` on /metrics.
+    """
+
+    def __init__(self, maxsize=1000, ttl=3600, max_chars=200, intentions=("question",)):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_chars = max_chars
+        self.intentions = set(intentions)
+        self._entries = OrderedDict()  # key -> (stored_at, output)
+        self._lock = threading.Lock()
+
+    def key(self, message, lang, prompt_version):
+        """Cache key, or None when the message is not eligible (too long or personal)."""
+        if not message or len(message) > self.max_chars or _PERSONAL_RE.search(message):
+            return None
+        normalized = normalize_message(message)
+        if not normalized:
+            return None
+        return hashlib.sha256(f"{prompt_version}\x00{lang}\x00{normalized}".encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """A copy of the cached output, or None (counted as a hit/miss; key None counts as a skip)."""
+        if key is None:
+            metrics.inc("tony_answer_cache_total", result="skip")
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+        metrics.inc("tony_answer_cache_total", result="hit" if entry else "miss")
+        return dict(entry[1]) if entry else None
+
+    def cacheable(self, output):
+        return (
+            "error" not in output
+            and output.get("intention") in self.intentions
+            and bool(output.get("response"))
+            and all(output.get(field, "null") == "null" for field in CONTACT_FIELDS)
+        )
+
+    def put(self, key, output):
+        """Stores `output` if it is a context-free answer; returns whether it was stored."""
+        if key is None or not self.cacheable(output):
+            return False
+        with self._lock:
+            self._entries[key] = (time.monotonic(), dict(output))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+            size = len(self._entries)
+        metrics.gauge_set("tony_answer_cache_entries", size)
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        metrics.gauge_set("tony_answer_cache_entries", 0)
+
+
+metrics.describe("tony_answer_cache_total", "counter", "Tony answer cache lookups by result (hit, miss, skip)")
+metrics.describe("tony_answer_cache_entries", "gauge", "Answers currently cached")
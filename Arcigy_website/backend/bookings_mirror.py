@@ -0,0 +1,182 @@
+import bisect
+import sqlite3
+import datetime
+import threading
+
+
+def _ts(iso):
+    return datetime.datetime.fromisoformat(iso.replace("Z", "+00:00")).timestamp()
+
+
+class BookingsMirror:
+    """
+    Local copy of future Cal.com bookings, so availability checks don't re-download
+    the whole calendar on every request.
+
+    Bookings are kept in an index sorted by start (what `intervals()` and the
+    free-slot sweep consume) and optionally persisted to SQLite so a restart
+    starts warm. A background thread re-syncs every `sync_interval` seconds
+    and Cal.com webhooks apply single changes in between.
+
+    `fetch()` returns the current future bookings as Cal.com booking dicts.
+    """
+
+    def __init__(self, fetch, sync_interval=120.0, db_path=None):
+        self.fetch = fetch
+        self.sync_interval = sync_interval
+        self.db_path = db_path
+        self._lock = threading.RLock()
+        self._by_uid = {}    # uid -> (start_ts, end_ts, start_iso, end_iso)
+        self._index = []     # sorted [(start_ts, end_ts, uid)]
+        self._version = 0
+        self._summary = (None, [])
+        self.synced_at = None
+        self._thread = None
+        self._stopping = threading.Event()
+        if db_path:
+            self._load_db()
+
+    # --- persistence ---
+    def _db(self):
+        conn = sqlite3.connect(self.db_path, timeout=5)
+        conn.execute("create table if not exists bookings (uid text primary key, start text not null, end text not null)")
+        return conn
+
+    def _load_db(self):
+        try:
+            with self._db() as conn:
+                rows = conn.execute("select uid, start, end from bookings").fetchall()
+            with self._lock:
+                for uid, start, end in rows:
+                    self._insert(uid, start, end)
+            if rows:
+                print(f"Bookings mirror: loaded {len(rows)} bookings from {self.db_path}")
+        except Exception as e:
+            print(f"Bookings mirror DB load error: {e}")
+
+    def _persist(self, upserts, deletes):
+        if not self.db_path or not (upserts or deletes):
+            return
+        try:
+            with self._db() as conn:
+                conn.executemany("insert or replace into bookings (uid, start, end) values (?, ?, ?)", upserts)
+                conn.executemany("delete from bookings where uid = ?", [(uid,) for uid in deletes])
+        except Exception as e:
+            print(f"Bookings mirror DB write error: {e}")
+
+    # --- index ---
+    def _insert(self, uid, start, end):
+        self._delete(uid)
+        start_ts, end_ts = _ts(start), _ts(end)
+        self._by_uid[uid] = (start_ts, end_ts, start, end)
+        bisect.insort(self._index, (start_ts, end_ts, uid))
+        self._version += 1
+
+    def _delete(self, uid):
+        old = self._by_uid.pop(uid, None)
+        if old is None:
+            return False
+        key = (old[0], old[1], uid)
+        i = bisect.bisect_left(self._index, key)
+        if i < len(self._index) and self._index[i] == key:
+            del self._index[i]
+        self._version += 1
+        return True
+
+    def upsert(self, uid, start, end):
+        with self._lock:
+            self._insert(uid, start, end)
+        self._persist([(uid, start, end)], [])
+
+    def remove(self, uid):
+        with self._lock:
+            removed = self._delete(uid)
+        if removed:
+            self._persist([], [uid])
+
+    def intervals(self, since_ts=None):
+        """All (start_ts, end_ts) intervals ending after `since_ts`, sorted by start."""
+        with self._lock:
+            return [(s, e) for s, e, _ in self._index if since_ts is None or e > since_ts]
+
+    def summary(self):
+        """The frontend's `bookings_summary` strings for future bookings; rebuilt only when the index changes."""
+        now = datetime.datetime.now(datetime.timezone.utc).timestamp()
+        with self._lock:
+            version, lines = self._summary
+            if version != (self._version, int(now // 60)):
+                lines = [f"booking: ({self._by_uid[uid][2]}), ({self._by_uid[uid][3]})" for s, e, uid in self._index if e > now]
+                self._summary = ((self._version, int(now // 60)), lines)
+            return list(lines)
+
+    @property
+    def ready(self):
+        return self.synced_at is not None or bool(self._by_uid)
+
+    # --- sync ---
+    def apply_booking(self, booking):
+        """Applies one Cal.com booking dict (from a sync or a webhook payload)."""
+        uid = booking.get("uid")
+        if not uid:
+            return
+        status = (booking.get("status") or "ACCEPTED").upper()
+        if status in ("CANCELLED", "REJECTED") or not booking.get("startTime") or not booking.get("endTime"):
+            self.remove(uid)
+        else:
+            self.upsert(uid, booking["startTime"], booking["endTime"])
+
+    def sync(self):
+        """Full refresh of future bookings, applied as a diff so unchanged rows cost nothing."""
+        bookings = self.fetch()
+        if bookings is None:
+            return False
+        now = datetime.datetime.now(datetime.timezone.utc).timestamp()
+        fresh = {}
+        for b in bookings:
+            status = (b.get("status") or "ACCEPTED").upper()
+            if b.get("uid") and b.get("startTime") and b.get("endTime") and status not in ("CANCELLED", "REJECTED"):
+                fresh[b["uid"]] = (b["startTime"], b["endTime"])
+        upserts, deletes = [], []
+        with self._lock:
+            for uid, (start, end) in fresh.items():
+                current = self._by_uid.get(uid)
+                if current is None or current[2:] != (start, end):
+                    self._insert(uid, start, end)
+                    upserts.append((uid, start, end))
+            for uid in list(self._by_uid):
+                # Past bookings are simply dropped; future ones missing from Cal.com were cancelled
+                if uid not in fresh:
+                    self._delete(uid)
+                    deletes.append(uid)
+            self.synced_at = now
+        self._persist(upserts, deletes)
+        return True
+
+    def _run(self):
+        failures = 0
+        while not self._stopping.is_set():
+            if self.synced_at is not None and not failures:
+                age = datetime.datetime.now(datetime.timezone.utc).timestamp() - self.synced_at
+                if age < self.sync_interval:
+                    self._stopping.wait(self.sync_interval - age)
+                    continue
+            try:
+                ok = self.sync()
+            except Exception as e:
+                print(f"Bookings mirror sync error: {e}")
+                ok = False
+            if ok:
+                failures = 0
+                continue
+            # A failed fetch (None or an exception) waits sync_interval, doubling up to 8x while it keeps failing
+            failures += 1
+            self._stopping.wait(self.sync_interval * 2 ** min(failures - 1, 3))
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="bookings-mirror", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
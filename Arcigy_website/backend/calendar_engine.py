@@ -1,71 +1,213 @@
 import os
+import sys
 import json
 import requests
 import datetime
-from dotenv import load_dotenv
+from startup import load_env
+from bookings_mirror import BookingsMirror
+try:
+    from chatbot_tools.phone_utils import normalize_phone
+    from chatbot_tools.free_slots import free_ranges, parse_business_hours
+    from chatbot_tools.idempotency import booking_requests, idempotency_key
+    from chatbot_tools.slot_holds import SlotHolds, ts_iso
+    from chatbot_tools.metrics import metrics
+    from chatbot_tools.resilience import upstream
+    from chatbot_tools.log import log
+except ImportError:
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+    from chatbot_tools.phone_utils import normalize_phone
+    from chatbot_tools.free_slots import free_ranges, parse_business_hours
+    from chatbot_tools.idempotency import booking_requests, idempotency_key
+    from chatbot_tools.slot_holds import SlotHolds, ts_iso
+    from chatbot_tools.metrics import metrics
+    from chatbot_tools.resilience import upstream
+    from chatbot_tools.log import log
 
-# Load environment variables from root .env
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-# Up 3 levels: backend -> Arcigy_website -> cloud_automations -> Agentic Workflows
-root_env = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(BASE_DIR))), ".env")
-if os.path.exists(root_env):
-    load_dotenv(root_env, override=True)
-else:
-    load_dotenv(override=True)
+# Load environment variables from root .env (once per process, shared with tony_backend)
+load_env()
 
 # Configurations
 CAL_API_KEY = os.getenv("CAL_API_KEY") or "cal_live_6101fbb825f9173a4f3e7045d20d5bdc"
 CAL_EVENT_TYPE_ID = os.getenv("CAL_EVENT_TYPE_ID") or "3877498"
+CAL_BASE_URL = os.getenv("CAL_BASE_URL", "https://api.cal.com/v1")
+CAL_TIMEZONE = os.getenv("CAL_TIMEZONE", "Europe/Bratislava")
+# e.g. "0-4 08:00-18:00" (weekday 0 = Monday); defaults to Mon-Fri 08:00-18:00
+BUSINESS_HOURS = parse_business_hours(os.getenv("BUSINESS_HOURS"))
+DEFAULT_DURATION_MIN = int(os.getenv("DEFAULT_DURATION_MIN", 30))
+# Longest range one free-slots request may cover (each day is computed on the server)
+MAX_FREE_SLOTS_DAYS = int(os.getenv("MAX_FREE_SLOTS_DAYS", 60))
 
-def get_calendar_availability():
+# Circuit breaker + adaptive timeout: when Cal.com is down, calls fail fast and the
+# bookings mirror keeps serving its last good copy
+calcom = upstream("calcom", max_timeout=15.0)
+
+def _fetch_future_bookings(page_size=100, max_pages=50):
     """
-    Fetches bookings from Cal.com and returns a formatted summary for the frontend.
-    Replicates the logic from n8n 'HTTP Request1' and 'Code in JavaScript' nodes.
+    Downloads all future bookings from Cal.com (paged). Returns None on error so the
+    mirror keeps its last good copy.
     """
-    try:
-        # Cal.com v1 API for bookings (as used in n8n)
-        url = "https://api.cal.com/v1/bookings"
+    # Cal.com v1 API for bookings (as used in n8n)
+    url = f"{CAL_BASE_URL}/bookings"
+    bookings, seen = [], set()
+    for page in range(1, max_pages + 1):
         params = {
             "apiKey": CAL_API_KEY,
             "eventTypeId": CAL_EVENT_TYPE_ID,
-            "dateFrom": datetime.datetime.now().isoformat()
+            "dateFrom": datetime.datetime.now().isoformat(),
+            "take": page_size,
+            "page": page
         }
-        
-        response = requests.get(url, params=params)
+        with calcom.guard(budget=15, operation="GET /v1/bookings") as call, metrics.timed("calcom", "GET /v1/bookings"):
+            response = requests.get(url, params=params, timeout=call.timeout)
+            if not response.ok:
+                # 4xx too (bad key, rate limit): the mirror can't sync, so count it against the breaker
+                call.failed()
+                metrics.inc("upstream_errors_total", upstream="calcom", operation="GET /v1/bookings")
         if not response.ok:
             print(f"Cal.com Error: {response.status_code} - {response.text}")
+            return None
+        batch = response.json().get("bookings", [])
+        new = [b for b in batch if b.get("uid") not in seen]
+        bookings.extend(new)
+        seen.update(b.get("uid") for b in new)
+        # Stop on a short page, or if the API ignores paging and repeats itself
+        if len(batch) < page_size or not new:
+            break
+    return bookings
+
+# Local mirror of future bookings: refreshed in the background + by Cal.com webhooks
+bookings_mirror = BookingsMirror(_fetch_future_bookings, db_path=os.getenv("BOOKINGS_DB_PATH"))
+
+# Holds on slots picked on the website until the email link is confirmed (shared with the
+# voice agent when SLOT_HOLDS_DB_PATH points to the same file)
+SLOT_HOLD_TTL = int(os.getenv("SLOT_HOLD_TTL_WEB", 900))
+slot_holds = SlotHolds(ttl=SLOT_HOLD_TTL, db_path=os.getenv("SLOT_HOLDS_DB_PATH"))
+
+def hold_slot(booking_time_iso, email, duration_min=None):
+    """Reserves the picked slot for this email while the confirmation is pending. False if it's taken."""
+    try:
+        return slot_holds.hold(booking_time_iso, email.strip().lower(), duration_min or DEFAULT_DURATION_MIN)
+    except Exception as e:
+        # Never block a booking because of the hold store itself
+        print(f"Slot hold error: {e}")
+        return True
+
+def release_slot(booking_time_iso, email):
+    """Drops this email's hold (e.g. the confirmation email could not be sent)."""
+    try:
+        slot_holds.release(booking_time_iso, email.strip().lower())
+    except Exception as e:
+        print(f"Slot release error: {e}")
+
+def get_calendar_availability():
+    """
+    Returns the bookings summary for the frontend from the local bookings mirror.
+    Replicates the logic from n8n 'HTTP Request1' and 'Code in JavaScript' nodes.
+    """
+    try:
+        # Cold start: fill the mirror once inline, afterwards it is kept fresh in the background
+        if not bookings_mirror.ready and not bookings_mirror.sync():
             return []
+        bookings_mirror.start()
+
+        # Slots held by someone else are shown as taken too
+        held = [f"booking: ({ts_iso(a)}), ({ts_iso(b)})" for a, b in slot_holds.held()]
 
-        data = response.json()
-        bookings = data.get("bookings", [])
-        
-        transformed_bookings = []
-        for b in bookings:
-            start = b.get("startTime")
-            end = b.get("endTime")
-            if start and end:
-                transformed_bookings.append(f"booking: ({start}), ({end})")
-        
         # The frontend expects a list with an object containing bookings_summary
-        return [{ "bookings_summary": transformed_bookings }]
+        return [{ "bookings_summary": bookings_mirror.summary() + held }]
 
     except Exception as e:
         print(f"Error in Calendar Engine (Availability): {e}")
         return []
 
+def get_free_slots(date_from=None, date_to=None, duration_min=None, granularity_min=15):
+    """
+    Free ranges (inside business hours, minus Cal.com bookings) that fit at least one
+    `duration_min` appointment, computed server-side from the bookings mirror.
+    Defaults to the next 14 days; longer ranges are cut at MAX_FREE_SLOTS_DAYS.
+    """
+    try:
+        now = datetime.datetime.now(datetime.timezone.utc)
+        start = _parse_iso(date_from) if date_from else now
+        end = _parse_iso(date_to) if date_to else start + datetime.timedelta(days=14)
+        start = max(start, now)
+        end = min(end, start + datetime.timedelta(days=MAX_FREE_SLOTS_DAYS))
+        duration_min = duration_min or DEFAULT_DURATION_MIN
+
+        if not bookings_mirror.ready and not bookings_mirror.sync():
+            return {"status": "error", "message": "Calendar unavailable"}
+        bookings_mirror.start()
+
+        busy = bookings_mirror.intervals(since_ts=start.timestamp()) + slot_holds.held()
+        ranges = free_ranges(
+            busy, start, end,
+            duration_min=duration_min, hours=BUSINESS_HOURS, timezone=CAL_TIMEZONE, granularity_min=granularity_min
+        )
+        return {
+            "status": "success",
+            "timezone": CAL_TIMEZONE,
+            "duration_min": duration_min,
+            "free": [[a.isoformat(timespec="minutes"), b.isoformat(timespec="minutes")] for a, b in ranges]
+        }
+    except Exception as e:
+        print(f"Error in Calendar Engine (Free slots): {e}")
+        return {"status": "error", "message": str(e)}
+
+def _parse_iso(value):
+    dt = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return dt if dt.tzinfo else dt.replace(tzinfo=datetime.timezone.utc)
+
+def get_bookings_for_day(day):
+    """
+    Returns accepted Cal.com bookings starting on `day` (a date) as
+    [{"uid", "start", "email", "name"}], one entry per attendee.
+    """
+    try:
+        start = datetime.datetime.combine(day, datetime.time.min)
+        end = start + datetime.timedelta(days=1)
+        params = {
+            "apiKey": CAL_API_KEY,
+            "eventTypeId": CAL_EVENT_TYPE_ID,
+            "dateFrom": start.isoformat(),
+            "dateTo": end.isoformat()
+        }
+        with calcom.guard(budget=15, operation="GET /v1/bookings") as call, metrics.timed("calcom", "GET /v1/bookings"):
+            response = requests.get(f"{CAL_BASE_URL}/bookings", params=params, timeout=call.timeout)
+            if response.status_code >= 500:
+                call.failed()
+                metrics.inc("upstream_errors_total", upstream="calcom", operation="GET /v1/bookings")
+        response.raise_for_status()
+
+        result = []
+        for b in response.json().get("bookings", []):
+            begins = b.get("startTime") or ""
+            if b.get("status", "ACCEPTED").upper() != "ACCEPTED" or not begins.startswith(day.isoformat()):
+                continue
+            for attendee in b.get("attendees", []):
+                if attendee.get("email"):
+                    result.append({"uid": b.get("uid"), "start": begins, "email": attendee["email"], "name": attendee.get("name", "")})
+        return result
+    except Exception as e:
+        print(f"Error in Calendar Engine (Day bookings): {e}")
+        return []
+
 def confirm_booking(booking_time_iso, email, name, phone, conversation_id=None):
     """
-    Creates a real booking in Cal.com.
+    Creates a real booking in Cal.com, at most once per (time, email, phone).
+    Repeats (link prefetch by mail scanners, double clicks) get the first result
+    with "repeated": True; concurrent repeats wait for the first call.
     """
+    # Normalize to E.164 (handles a URL-mangled '+' arriving as ' ')
+    phone = normalize_phone(phone) or phone
+    key = idempotency_key(booking_time_iso, email, phone)
+    return booking_requests.run(key, lambda: _create_booking(booking_time_iso, email, name, phone, conversation_id))
+
+def _create_booking(booking_time_iso, email, name, phone, conversation_id=None):
     try:
-        # Sanitize phone number (if it comes from URL, '+' might become ' ')
-        if phone and phone.startswith(" ") and not phone.startswith("+"):
-            phone = "+" + phone.strip()
-        elif phone and not phone.startswith("+") and phone.isdigit():
-            # If it's just digits, we might want to keep it as is or add +
-            pass 
-
-        url = "https://api.cal.com/v1/bookings"
+        if not slot_holds.consume(booking_time_iso, email.strip().lower()):
+            return {"status": "error", "message": "This time slot is being booked by someone else. Please pick another time."}
+
+        url = f"{CAL_BASE_URL}/bookings"
         payload = {
             "eventTypeId": int(CAL_EVENT_TYPE_ID),
             "start": booking_time_iso,
@@ -82,22 +224,29 @@ def confirm_booking(booking_time_iso, email, name, phone, conversation_id=None):
             "metadata": {"conversation_id": conversation_id}
         }
         
-        print(f"DEBUG: Sending to Cal.com: {json.dumps(payload)}")
+        log.debug("calcom_booking_request", payload=payload)
         
-        response = requests.post(
-            url, 
-            params={"apiKey": CAL_API_KEY}, 
-            json=payload
-        )
+        with calcom.guard(budget=15, operation="POST /v1/bookings", adaptive=False) as call, metrics.timed("calcom", "POST /v1/bookings"):
+            response = requests.post(
+                url, 
+                params={"apiKey": CAL_API_KEY}, 
+                json=payload,
+                timeout=call.timeout
+            )
+            if response.status_code >= 500:
+                call.failed()
+                metrics.inc("upstream_errors_total", upstream="calcom", operation="POST /v1/bookings")
         
         if response.ok:
-            return {"status": "success", "message": "Booking confirmed", "data": response.json()}
+            data = response.json()
+            bookings_mirror.apply_booking(data)
+            return {"status": "success", "message": "Booking confirmed", "data": data}
         else:
-            print(f"Booking Error: {response.text}")
+            log.warning("calcom_booking_rejected", status=response.status_code, body=response.text)
             return {"status": "error", "message": response.text}
             
     except Exception as e:
-        print(f"Error in Calendar Engine (Confirm): {e}")
+        log.error("calcom_booking_error", error=e)
         return {"status": "error", "message": str(e)}
 
 def cancel_booking(uid):
@@ -105,9 +254,14 @@ def cancel_booking(uid):
     Cancels an existing booking by its UID.
     """
     try:
-        url = f"https://api.cal.com/v1/bookings/{uid}/cancel"
-        response = requests.delete(url, params={"apiKey": CAL_API_KEY})
+        url = f"{CAL_BASE_URL}/bookings/{uid}/cancel"
+        with calcom.guard(budget=15, operation="DELETE /v1/bookings/cancel", adaptive=False) as call, metrics.timed("calcom", "DELETE /v1/bookings/cancel"):
+            response = requests.delete(url, params={"apiKey": CAL_API_KEY}, timeout=call.timeout)
+            if response.status_code >= 500:
+                call.failed()
+                metrics.inc("upstream_errors_total", upstream="calcom", operation="DELETE /v1/bookings/cancel")
         if response.ok:
+            bookings_mirror.remove(uid)
             return {"status": "success", "message": "Booking canceled"}
         return {"status": "error", "message": response.text}
     except Exception as e:
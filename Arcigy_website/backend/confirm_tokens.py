@@ -0,0 +1,85 @@
+import os
+import hmac
+import json
+import time
+import base64
+import hashlib
+from startup import load_env
+
+# Field order of the signed payload (version 1); kept positional so links stay short
+_FIELDS = ("action", "time", "email", "name", "phone", "lang", "cid")
+_VERSION = 1
+
+
+class InvalidToken(Exception):
+    """Raised for tampered, malformed or expired confirmation tokens."""
+
+
+def _b64encode(raw):
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+class ConfirmTokens:
+    """
+    Compact, HMAC-signed confirmation tokens for email links.
+
+    The pending booking is packed into the token itself (`<payload>.<signature>`,
+    base64url), so `/webhook/confirm?t=...` needs no server-side storage and keeps
+    working across restarts and workers. Verification is one HMAC over a short
+    string; tampered or expired tokens are rejected before anything calls Cal.com.
+    Without a secret it fails closed: `issue()` raises and every token is invalid.
+    """
+
+    def __init__(self, secret=None, ttl=48 * 3600, signature_bytes=16):
+        if not secret:
+            print("❌ CONFIRM_TOKEN_SECRET not set: booking confirmation links are disabled")
+        self._key = (secret.encode() if isinstance(secret, str) else secret) or None
+        self.ttl = ttl
+        self.signature_bytes = signature_bytes
+
+    @property
+    def enabled(self):
+        return self._key is not None
+
+    def _sign(self, payload):
+        return hmac.new(self._key, payload.encode("ascii"), hashlib.sha256).digest()[:self.signature_bytes]
+
+    def issue(self, **fields):
+        """Token for a pending action; unknown fields are ignored, missing ones stored as null."""
+        if not self.enabled:
+            raise RuntimeError("CONFIRM_TOKEN_SECRET is not set")
+        expires = int(time.time() + self.ttl)
+        data = [_VERSION, expires] + [fields.get(name) for name in _FIELDS]
+        payload = _b64encode(json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+        return f"{payload}.{_b64encode(self._sign(payload))}"
+
+    def verify(self, token):
+        """Returns the fields dict, or raises InvalidToken."""
+        if not self.enabled:
+            raise InvalidToken("Confirmation links are disabled")
+        try:
+            payload, signature = token.split(".", 1)
+            valid = hmac.compare_digest(_b64decode(signature), self._sign(payload))
+        except (ValueError, AttributeError, UnicodeEncodeError):
+            raise InvalidToken("Malformed token")
+        if not valid:
+            raise InvalidToken("Invalid signature")
+        try:
+            data = json.loads(_b64decode(payload))
+            version, expires, values = data[0], data[1], data[2:]
+        except (ValueError, IndexError, TypeError):
+            raise InvalidToken("Malformed token")
+        if version != _VERSION or len(values) != len(_FIELDS):
+            raise InvalidToken("Unsupported token version")
+        if expires < time.time():
+            raise InvalidToken("Link expired")
+        return dict(zip(_FIELDS, values))
+
+
+# The secret comes from the root .env, which must be loaded before it is read
+load_env()
+confirm_tokens = ConfirmTokens(os.getenv("CONFIRM_TOKEN_SECRET"), ttl=int(os.getenv("CONFIRM_TOKEN_TTL", 48 * 3600)))
@@ -0,0 +1,112 @@
+import asyncio
+from collections import OrderedDict
+from functools import lru_cache
+
+
+@lru_cache(maxsize=1)
+def get_encoding():
+    """o200k_base tokenizer, loaded on first use (the BPE table takes a while to build) or None without tiktoken."""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        return None
+
+
+def count_tokens(text):
+    """Token count for gpt-4o models; falls back to a ~4 chars/token estimate without tiktoken."""
+    if not text:
+        return 0
+    encoding = get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return len(text) // 4 + 1
+
+
+def truncate_tokens(text, budget):
+    """Keeps the end of `text` within `budget` tokens (the most recent part matters most)."""
+    if count_tokens(text) <= budget:
+        return text
+    encoding = get_encoding()
+    if encoding is not None:
+        return encoding.decode(encoding.encode(text, disallowed_special=())[-budget:])
+    return text[-budget * 4:]
+
+
+class ContextBuilder:
+    """
+    Builds the history block for a Tony prompt under a hard token budget.
+
+    At least the last `keep_messages` messages are sent verbatim. Older messages are folded into
+    a rolling summary that is cached per conversation and only regenerated when the
+    window has moved by `summary_step` messages, so most turns reuse it as-is.
+    `summarize(previous_summary, lines)` is an async callable returning the new summary;
+    it runs in a background task (one per conversation), and until it finishes the
+    turn is built from the previous summary plus as many verbatim lines as fit.
+    """
+
+    def __init__(self, summarize=None, keep_messages=12, summary_step=6, budget=2000, summary_budget=400, maxsize=2000):
+        self.summarize = summarize
+        self.keep_messages = keep_messages
+        self.summary_step = summary_step
+        self.budget = budget
+        self.summary_budget = summary_budget
+        self.maxsize = maxsize
+        self._summaries = OrderedDict()  # conversation id -> (messages covered, summary)
+        self._pending = {}  # conversation id -> running summarize task
+
+    def _cached(self, conversation_id):
+        entry = self._summaries.get(conversation_id)
+        if entry is not None:
+            self._summaries.move_to_end(conversation_id)
+        return entry or (0, "")
+
+    def _store(self, conversation_id, covered, summary):
+        self._summaries[conversation_id] = (covered, summary)
+        self._summaries.move_to_end(conversation_id)
+        while len(self._summaries) > self.maxsize:
+            self._summaries.popitem(last=False)
+
+    async def _refresh_summary(self, conversation_id, summary, lines, cut):
+        try:
+            summary = truncate_tokens(await self.summarize(summary, lines), self.summary_budget)
+            self._store(conversation_id, cut, summary)
+        except Exception as e:
+            print(f"Summary error (keeping previous summary): {e}")
+        finally:
+            self._pending.pop(conversation_id, None)
+
+    def _summary_for(self, conversation_id, lines, cut):
+        covered, summary = self._cached(conversation_id)
+        if covered > cut:
+            # History was replaced by the client (shorter than before); start over
+            covered, summary = 0, ""
+        if covered != cut and self.summarize is not None and conversation_id not in self._pending:
+            # Off the request path: this turn uses the previous summary
+            self._pending[conversation_id] = asyncio.get_running_loop().create_task(
+                self._refresh_summary(conversation_id, summary, lines[covered:cut], cut)
+            )
+        return covered, summary
+
+    async def build(self, conversation_id, lines):
+        """Returns the history text for the prompt: rolling summary + recent messages, within budget."""
+        lines = list(lines or [])
+        overflow = len(lines) - self.keep_messages
+        # Move the summary boundary in steps so the summary (and the prompt prefix) stays stable
+        cut = overflow // self.summary_step * self.summary_step if overflow > 0 else 0
+        covered, summary = self._summary_for(conversation_id, lines, cut)
+
+        # Anything not covered by the summary is sent verbatim, newest first until the budget is spent
+        header = f"ZHRNUTIE STARŠEJ ČASTI KONVERZÁCIE:\n{summary}\n\n" if summary else ""
+        remaining = self.budget - count_tokens(header)
+        recent = []
+        for line in reversed(lines[covered:]):
+            cost = count_tokens(line) + 1
+            if cost > remaining:
+                if not recent:
+                    recent.append(truncate_tokens(line, max(remaining, 0)))
+                break
+            recent.append(line)
+            remaining -= cost
+        recent.reverse()
+        return header + "\n".join(recent)
@@ -0,0 +1,202 @@
+"""
+Append-only conversation turn log.
+
+Every chat turn becomes one row in `ConversationTurns`, written in batches by a
+background thread, so the cost per message stays constant however long the chat
+gets. Turns are ordered by the database-assigned `id`, so several worker
+processes can append to the same conversation without colliding.
+`ConversationMemory.conversation` is kept as a materialized transcript that is
+extended every `compact_every` turns with only the turns logged since the last
+compaction (the first compaction in a process reads the whole log once).
+A batch that fails to insert is kept and retried with backoff, ahead of newer turns.
+
+Expected table:
+
+    create table "ConversationTurns" (
+        id bigserial primary key,
+        "messageID" text not null,
+        user_message text,
+        bot_response text,
+        created_at timestamptz not null default now()
+    );
+    create index on "ConversationTurns" ("messageID", id);
+"""
+import os
+import sys
+import queue
+import threading
+import datetime
+try:
+    from chatbot_tools.metrics import metrics
+    from chatbot_tools.resilience import upstream
+except ImportError:
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+    from chatbot_tools.metrics import metrics
+    from chatbot_tools.resilience import upstream
+
+TURNS_TABLE = "ConversationTurns"
+MEMORY_TABLE = "ConversationMemory"
+
+# Reads on the request path go through the breaker, so once Supabase is known to be down
+# they fail fast. The client takes no per-call timeout, so the guard does not adapt one.
+supabase_api = upstream("supabase")
+
+
+class TurnLogWriter:
+    def __init__(self, get_client, batch_size=50, flush_interval=2.0, compact_every=10, max_queue=10000):
+        self.get_client = get_client
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.compact_every = compact_every
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._uncompacted = {}   # conversation id -> turns written since the last compaction
+        self._evicted = set()    # conversations dropped from the session store, compacted then forgotten
+        self._transcripts = {}   # conversation id -> (id of the last compacted turn, transcript)
+        self._thread = None
+        self._stopping = threading.Event()
+
+    def forget(self, conversation_id):
+        """Drops per-conversation state (hooked to session store eviction); pending turns are compacted first."""
+        with self._lock:
+            self._evicted.add(conversation_id)
+
+    def append(self, conversation_id, message, response):
+        """Queues one turn for writing. Never blocks the caller on the database."""
+        self.start()
+        row = {
+            "messageID": conversation_id,
+            "user_message": message,
+            "bot_response": response,
+            "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat()
+        }
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            print(f"Turn log queue full, dropping turn for {conversation_id}")
+
+    def _drain(self, first=None):
+        batch = [first] if first is not None else []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        """Inserts one batch; returns False if it failed and should be retried."""
+        client = self.get_client()
+        if client is None or not batch:
+            return True
+        try:
+            with metrics.timed("supabase", "ConversationTurns.insert"):
+                client.table(TURNS_TABLE).insert(batch).execute()
+        except Exception as e:
+            print(f"Database Warning (Turns): {e}")
+            return False
+
+        due = []
+        with self._lock:
+            for row in batch:
+                cid = row["messageID"]
+                count = self._uncompacted.get(cid)
+                # Compact the first turn this process sees too, so the memory row exists right away
+                count = self.compact_every if count is None else count + 1
+                if count >= self.compact_every:
+                    due.append(cid)
+                    count = 0
+                self._uncompacted[cid] = count
+        for cid in dict.fromkeys(due):
+            self.compact(cid)
+        return True
+
+    def _drop_evicted(self):
+        with self._lock:
+            evicted, self._evicted = self._evicted, set()
+        for cid in evicted:
+            if self._uncompacted.get(cid):
+                self.compact(cid)
+            with self._lock:
+                self._uncompacted.pop(cid, None)
+                self._transcripts.pop(cid, None)
+
+    def compact(self, conversation_id):
+        """Brings ConversationMemory.conversation up to date with the turns logged since the last compaction."""
+        client = self.get_client()
+        if client is None:
+            return
+        with self._lock:
+            last_id, transcript = self._transcripts.get(conversation_id, (None, ""))
+        try:
+            with metrics.timed("supabase", "ConversationMemory.compact"):
+                query = client.table(TURNS_TABLE).select("id,user_message,bot_response").eq("messageID", conversation_id)
+                if last_id is not None:
+                    query = query.gt("id", last_id)
+                res = query.order("id").execute()
+                if res.data or last_id is None:
+                    lines = [transcript] if transcript else []
+                    lines += [f"User: {t['user_message']}\nBot: {t['bot_response']}" for t in res.data]
+                    transcript = "\n".join(lines)
+                    client.table(MEMORY_TABLE).upsert(
+                        {"messageID": conversation_id, "conversation": transcript}, on_conflict="messageID"
+                    ).execute()
+                    if res.data:
+                        last_id = res.data[-1]["id"]
+            with self._lock:
+                self._uncompacted[conversation_id] = 0
+                self._transcripts[conversation_id] = (last_id, transcript)
+        except Exception as e:
+            print(f"Database Warning (Memory compaction): {e}")
+
+    def load_history(self, conversation_id):
+        """Reads a conversation back as [{"type", "text"}, ...] (used by the session store on a miss)."""
+        client = self.get_client()
+        if client is None:
+            return []
+        with supabase_api.guard(operation="ConversationTurns.load", adaptive=False), metrics.timed("supabase", "ConversationTurns.load"):
+            res = client.table(TURNS_TABLE).select("user_message,bot_response").eq("messageID", conversation_id) \
+                .order("id").execute()
+        history = []
+        for t in res.data:
+            history.append({"type": "user", "text": t["user_message"]})
+            history.append({"type": "bot", "text": t["bot_response"]})
+        return history
+
+    def _run(self):
+        retry, delay = None, self.flush_interval  # batch whose insert failed, written before anything newer
+        while not self._stopping.is_set() or not self._queue.empty() or retry:
+            if retry is not None:
+                batch = retry
+            else:
+                try:
+                    first = self._queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    self._drop_evicted()
+                    continue
+                batch = self._drain(first)
+            if self._write(batch):
+                retry, delay = None, self.flush_interval
+            elif self._stopping.is_set():
+                print(f"Turn log: dropping {len(batch)} turns that could not be written before shutdown")
+                retry = None
+            else:
+                retry = batch
+                self._stopping.wait(delay)
+                delay = min(delay * 2, 60.0)
+            self._drop_evicted()
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="turn-log-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=10.0):
+        """Flushes queued turns, compacts pending conversations and stops the writer."""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        for cid, count in list(self._uncompacted.items()):
+            if count:
+                self.compact(cid)
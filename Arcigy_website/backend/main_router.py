@@ -1,21 +1,32 @@
+# First, so the startup report covers every import below
+from startup import import_timer, startup_report, schedule_warm_up
+import_timer.start()
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional
 import os
-import uvicorn
 
-# Import our custom engines
-from tony_backend import get_tony_response, persist_conversation
-from calendar_engine import get_calendar_availability, confirm_booking, cancel_booking
+# Import our custom engines (SDK clients, tokenizer and templates load lazily)
+from tony_backend import get_tony_response, stream_tony_response, persist_conversation, is_error_output, turn_log, session_store, warm_up_clients, warm_up_openai
+from calendar_engine import get_calendar_availability, get_free_slots, confirm_booking, cancel_booking, get_bookings_for_day, bookings_mirror, hold_slot, release_slot
+from confirm_tokens import confirm_tokens, InvalidToken
+from chatbot_tools.metrics import metrics, MetricsMiddleware
+from chatbot_tools.log import log, LogContextMiddleware
 try:
-    from utils.email_engine import send_confirmation_email
+    from utils.email_engine import queue_confirmation_email, mail_queue, sent_archiver, send_bulk_emails, batch_jobs, warm_up_templates
 except ImportError:
     import sys
     sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
-    from utils.email_engine import send_confirmation_email
-from fastapi import BackgroundTasks, Query
-from fastapi.responses import RedirectResponse
+    from utils.email_engine import queue_confirmation_email, mail_queue, sent_archiver, send_bulk_emails, batch_jobs, warm_up_templates
+from fastapi import BackgroundTasks, Query, Header
+from fastapi.responses import RedirectResponse, StreamingResponse, PlainTextResponse
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
+import json
+import hmac
+import hashlib
+import datetime
 import urllib.parse
 
 app = FastAPI(title="Tony AI Cloud Backend")
@@ -28,14 +39,55 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(LogContextMiddleware)
+
+@app.on_event("shutdown")
+def flush_turn_log():
+    turn_log.stop()
+
+@app.on_event("startup")
+def require_single_worker():
+    # Chat sessions, slot holds and delivery statuses are per process (see SessionStore)
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+    if workers > 1:
+        raise RuntimeError(f"WEB_CONCURRENCY={workers}: the website backend must run as a single worker")
+
+@app.on_event("startup")
+def start_background_workers():
+    # Picks up messages spooled before a restart
+    sent_archiver.start()
+    # Warms the bookings mirror so the first availability check is served locally
+    bookings_mirror.start()
+
+@app.on_event("startup")
+async def warm_up():
+    startup_report(metrics)
+    # Background task: the hook returns at once and uvicorn binds the port while clients connect
+    if os.getenv("WARM_UP", "true").lower() != "false":
+        app.state.warm_up_task = schedule_warm_up(warm_up_clients, warm_up_openai, warm_up_templates)
+
+@app.on_event("shutdown")
+def flush_mail_queue():
+    mail_queue.stop()
+    sent_archiver.stop()
+    bookings_mirror.stop()
+    log.stop()
 
 # Models
 class ChatMessage(BaseModel):
     message: str
     conversationID: str
-    history: List[dict]
+    # Optional: the server keeps the history per conversationID; clients only need to send the new message
+    history: Optional[List[dict]] = None
     lang: Optional[str] = None
 
+class FreeSlotsQuery(BaseModel):
+    dateFrom: Optional[str] = None
+    dateTo: Optional[str] = None
+    # Non-positive durations are rejected with a 422
+    durationMin: Optional[int] = Field(None, gt=0, le=24 * 60)
+
 class BookingConfirm(BaseModel):
     bookingTime: str
     email: str
@@ -49,90 +101,261 @@ class BookingConfirm(BaseModel):
 def read_root():
     return {"status": "online", "agent": "Tony", "version": "2.0.0"}
 
+@app.get("/metrics")
+def metrics_endpoint():
+    """
+    Prometheus text format: per-route latency histograms and in-flight requests, plus
+    per-upstream (calcom, supabase, openai, smtp, imap) latency and error counts.
+    """
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+async def resolve_history(data: ChatMessage):
+    """Formatted transcript lines for this conversation, from the request (legacy clients) or the session store."""
+    if data.history is not None:
+        return session_store.replace(data.conversationID, data.history).lines
+    session = session_store.get(data.conversationID) or await run_in_threadpool(session_store.load, data.conversationID)
+    return session.lines
+
+def remember_turn(data: ChatMessage, output):
+    if not is_error_output(output):
+        session_store.append_turn(data.conversationID, data.message, output.get("response", ""))
+
 @app.post("/webhook/chat")
 async def chat_endpoint(data: ChatMessage, background_tasks: BackgroundTasks):
     """
     Main chat endpoint with V2 logic.
     """
-    response_json, formatted_history = get_tony_response(data.message, data.conversationID, data.history, data.lang)
+    history = await resolve_history(data)
+    response_json, formatted_history = await get_tony_response(data.message, data.conversationID, history, data.lang)
+    remember_turn(data, response_json)
     
     # Background persistence
     background_tasks.add_task(persist_conversation, data.conversationID, data.message, response_json, formatted_history)
     
     return response_json
 
+@app.post("/webhook/chat/stream")
+async def chat_stream_endpoint(data: ChatMessage):
+    """
+    Streaming variant of /webhook/chat (Server-Sent Events).
+    Emits `delta` events with pieces of the `response` text as they are generated,
+    then one `done` event carrying the same JSON object /webhook/chat returns.
+    """
+    final = {}
+    history = await resolve_history(data)
+
+    async def events():
+        async for event in stream_tony_response(data.message, data.conversationID, history, data.lang):
+            if event["event"] == "done":
+                final.update(event)
+                remember_turn(data, event["output"])
+                payload = event["output"]
+            else:
+                payload = {"response": event["response"]}
+            yield f"event: {event['event']}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+    def persist():
+        # Runs after the stream has been fully sent
+        if "output" in final:
+            persist_conversation(data.conversationID, data.message, final["output"], final["formatted_history"])
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(persist)
+    )
+
 @app.post("/webhook/calendar-availability-check")
 async def availability_endpoint():
-    return get_calendar_availability()
+    # Off the event loop: a cold or forced mirror sync calls Cal.com synchronously
+    return await run_in_threadpool(get_calendar_availability)
+
+@app.post("/webhook/calendar-free-slots")
+async def free_slots_endpoint(query: Optional[FreeSlotsQuery] = None):
+    """
+    Free time ranges computed on the server, e.g.
+    {"timezone": "Europe/Bratislava", "duration_min": 30, "free": [["2026-10-19T08:00+02:00", "2026-10-19T11:30+02:00"], ...]}
+    """
+    query = query or FreeSlotsQuery()
+    return await run_in_threadpool(get_free_slots, query.dateFrom, query.dateTo, query.durationMin)
+
+@app.post("/webhook/calcom")
+async def calcom_webhook(request: Request):
+    """
+    Cal.com webhook (BOOKING_CREATED / RESCHEDULED / CANCELLED) that keeps the local
+    bookings mirror current between background syncs.
+    Requires the X-Cal-Signature-256 signature made with CALCOM_WEBHOOK_SECRET; without
+    the secret configured every call is rejected, since availability is served from the mirror.
+    """
+    body = await request.body()
+    secret = os.getenv("CALCOM_WEBHOOK_SECRET")
+    if not secret:
+        raise HTTPException(status_code=403, detail="Forbidden")
+    expected = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(expected, request.headers.get("X-Cal-Signature-256", "")):
+        raise HTTPException(status_code=401, detail="Invalid signature")
+    try:
+        event = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON")
+
+    trigger = event.get("triggerEvent", "")
+    payload = event.get("payload") or {}
+    if trigger == "BOOKING_CANCELLED":
+        payload = dict(payload, status="CANCELLED")
+    elif trigger == "BOOKING_RESCHEDULED" and payload.get("rescheduleUid"):
+        bookings_mirror.remove(payload["rescheduleUid"])
+    bookings_mirror.apply_booking(payload)
+    return {"status": "ok"}
 
 @app.post("/webhook/calendar-initiate-book")
 async def initiate_booking(data: BookingConfirm, background_tasks: BackgroundTasks):
     """
     Sends a verification email instead of booking immediately.
     """
-    print(f"📧 BOOKING REQUEST RECEIVED:")
-    print(f"   Email: {data.email}")
-    print(f"   Name: {data.name}")
-    print(f"   Time: {data.bookingTime}")
-    print(f"   Phone: {data.phone}")
-    print(f"   Lang: {data.lang}")
-    
+    log.bind(conversation_id=data.conversationID)
+    log.info("booking_requested", email=data.email, name=data.name, time=data.bookingTime, phone=data.phone, lang=data.lang)
+
+    if not confirm_tokens.enabled:
+        log.error("confirm_tokens_disabled", reason="CONFIRM_TOKEN_SECRET is not set")
+        return {"status": "error", "message": "Booking confirmation is not available right now. Please try again later."}
+
+    # Reserve the slot until the email link is clicked, so no one else can take it meanwhile
+    if not await run_in_threadpool(hold_slot, data.bookingTime, data.email):
+        return {"status": "error", "message": "This time slot is being booked by someone else. Please pick another time."}
+
     # Use environment variable for BASE_URL to support localhost/ngrok/production
     base_url = os.getenv("WEB_BASE_URL", "http://127.0.0.1:8001")
     
-    # Generate confirmation URL
-    confirm_params = {
-        "action": "book",
-        "time": data.bookingTime,
-        "email": data.email,
-        "name": data.name,
-        "phone": data.phone,
-        "lang": data.lang,
-        "cid": data.conversationID
-    }
-    confirm_url = f"{base_url}/webhook/confirm?{urllib.parse.urlencode(confirm_params)}"
+    # Generate confirmation URL: one signed, expiring token instead of the raw booking fields
+    token = confirm_tokens.issue(
+        action="book",
+        time=data.bookingTime,
+        email=data.email,
+        name=data.name,
+        phone=data.phone,
+        lang=data.lang,
+        cid=data.conversationID
+    )
+    confirm_url = f"{base_url}/webhook/confirm?t={token}"
+
+    def release_hold(msg, error):
+        # The email never arrived, so nobody can confirm: free the slot now, not after the hold TTL
+        log.warning("confirmation_email_failed", email=data.email, time=data.bookingTime, error=error)
+        release_slot(data.bookingTime, data.email)
     
-    print(f"📨 Sending email to {data.email}...")
-    # We send it directly here to catch errors and notify the frontend if email fails
-    success = send_confirmation_email(
+    # Delivery happens on the mail queue; the frontend can poll /webhook/email-status/{delivery_id}
+    delivery_id = queue_confirmation_email(
         data.email, 
         data.name, 
         "book", 
         data.bookingTime, 
         confirm_url, 
-        data.lang
+        data.lang,
+        on_failed=release_hold
     )
     
-    if not success:
-        print(f"❌ Email FAILED to send!")
+    if not delivery_id:
+        log.error("confirmation_email_not_queued", email=data.email)
+        # Nobody can confirm this hold, so don't keep the slot blocked for the whole TTL
+        await run_in_threadpool(release_slot, data.bookingTime, data.email)
         return {"status": "error", "message": "Failed to send confirmation email. Please check server logs."}
 
-    print(f"✅ Email sent successfully!")
-    return {"status": "verification_sent", "message": "Check your email to confirm."}
+    log.info("confirmation_email_queued", email=data.email, delivery_id=delivery_id)
+    return {"status": "verification_sent", "message": "Check your email to confirm.", "delivery_id": delivery_id}
+
+@app.get("/webhook/email-status/{delivery_id}")
+async def email_status_endpoint(delivery_id: str):
+    """
+    Delivery status of a queued email: queued, sending, sent or failed.
+    """
+    status = mail_queue.status(delivery_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Unknown delivery id")
+    return status
+
+def require_reminders_key(x_api_key):
+    api_key = os.getenv("REMINDERS_API_KEY")
+    if not api_key or not hmac.compare_digest((x_api_key or "").encode(), api_key.encode()):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+@app.post("/webhook/send-reminders")
+def send_reminders_endpoint(action: str = "reminder", day_offset: int = 1, x_api_key: Optional[str] = Header(None)):
+    """
+    Emails everyone booked on today + `day_offset` (reminder, or followup with a negative offset).
+    The batch runs in the background (it keeps going if the caller disconnects); poll
+    /webhook/send-reminders/{job_id} for progress. Requires X-Api-Key = REMINDERS_API_KEY.
+    """
+    require_reminders_key(x_api_key)
+    if action not in ("reminder", "followup"):
+        raise HTTPException(status_code=400, detail="action must be reminder or followup")
+
+    frontend_url = os.getenv("FRONTEND_BASE_URL", "http://127.0.0.1:5500")
+    day = datetime.date.today() + datetime.timedelta(days=day_offset)
+    recipients = [
+        {"email": b["email"], "name": b["name"], "time": b["start"], "url": frontend_url, "lang": "sk"}
+        for b in get_bookings_for_day(day)
+    ]
+    job_id = batch_jobs.start(send_bulk_emails(recipients, action_type=action), total=len(recipients), action=action, day=day.isoformat())
+    log.info("bulk_email_started", action=action, recipients=len(recipients), day=day, job_id=job_id)
+    return {"status": "started", "job_id": job_id, "recipients": len(recipients)}
+
+@app.get("/webhook/send-reminders/{job_id}")
+def send_reminders_status_endpoint(job_id: str, x_api_key: Optional[str] = Header(None)):
+    """
+    Progress of a reminders batch: status (running, done, failed), sent/failed counts
+    and one result per recipient sent so far.
+    """
+    require_reminders_key(x_api_key)
+    job = batch_jobs.status(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job id")
+    return job
 
 @app.get("/webhook/confirm")
 async def confirm_action_webhook(
-    action: str, 
-    time: str, 
-    email: str, 
-    name: str, 
+    t: Optional[str] = None,
+    action: Optional[str] = None,
+    time: Optional[str] = None,
+    email: Optional[str] = None,
+    name: Optional[str] = None,
     phone: str = "null",
     lang: str = "sk", 
     cid: Optional[str] = None
 ):
     """
     Triggered by the email button. Performs the action and redirects to the landing page.
+    The link carries a signed token (`t`); unsigned query-string links are only
+    accepted while CONFIRM_LEGACY_LINKS is enabled.
     """
     # Use environment variable for Frontend URL
     frontend_url = os.getenv("FRONTEND_BASE_URL", "http://127.0.0.1:5500")
 
-    print(f"DEBUG: Processing Action={action}, Name={name}, Email={email}, Phone={phone}, Time={time}")
+    if t:
+        try:
+            fields = confirm_tokens.verify(t)
+        except InvalidToken as e:
+            log.warning("confirm_link_rejected", reason=str(e))
+            return {"status": "error", "message": "Invalid action or expired link"}
+        action, time, email, name, lang, cid = (fields[k] for k in ("action", "time", "email", "name", "lang", "cid"))
+        phone = fields["phone"] or "null"
+        lang = lang or "sk"
+    elif os.getenv("CONFIRM_LEGACY_LINKS", "false").lower() not in ("1", "true", "yes") or not (action and time and email and name):
+        return {"status": "error", "message": "Invalid action or expired link"}
+
+    log.bind(conversation_id=cid)
+    log.info("confirm_link_opened", action=action, name=name, email=email, phone=phone, time=time, legacy=not t)
     if action == "book":
         if not phone or phone == "null":
             return {"status": "error", "message": "Missing phone number. Please retry the booking through the chat."}
             
-        res = confirm_booking(time, email, name, phone, cid)
-        print(f"DEBUG: Cal.com Response Status={res['status']}, Message={res.get('message')}")
+        # Off the event loop: a repeat of an in-flight booking waits for its result
+        res = await run_in_threadpool(confirm_booking, time, email, name, phone, cid)
+        if res["status"] == "success":
+            log.info("booking_confirmed", time=time, email=email, repeated=res.get("repeated", False))
+        else:
+            log.warning("booking_confirm_failed", time=time, email=email, message=res.get("message"))
         
         if res["status"] == "success":
             # Redirect to beautiful landing page
@@ -145,4 +368,5 @@ async def confirm_action_webhook(
     return {"status": "error", "message": "Invalid action or expired link"}
 
 if __name__ == "__main__":
+    import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8001)
@@ -0,0 +1,91 @@
+import os
+import time
+import datetime
+import threading
+
+
+class PromptTemplate:
+    """
+    A prompt file loaded once and pre-split around its `{now}` placeholders.
+    The file is re-read only when its mtime changes (checked at most once per
+    `check_interval` seconds), so rendering is just a join.
+    """
+
+    def __init__(self, path, fallback="", check_interval=1.0):
+        self.path = path
+        self.fallback = fallback
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._checked_at = float("-inf")
+        self._missing_logged = False
+        self._text = fallback
+        self._parts = [fallback]
+
+    def _refresh(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            self._checked_at = now
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except OSError as e:
+                # Log once per outage, not on every check
+                if not self._missing_logged:
+                    print(f"Error loading prompt: {e}")
+                    self._missing_logged = True
+                self._mtime = None
+                self._text, self._parts = self.fallback, [self.fallback]
+                return
+            self._missing_logged = False
+            if mtime == self._mtime:
+                return
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    text = f.read()
+            except Exception as e:
+                print(f"Error loading prompt: {e}")
+                return
+            self._mtime = mtime
+            self._text, self._parts = text, text.split("{now}")
+            print(f"Prompt loaded: {self.path} ({len(text)} chars)")
+
+    @property
+    def text(self):
+        """The raw template text."""
+        self._refresh()
+        return self._text
+
+    @property
+    def version(self):
+        """Changes whenever the loaded template changes (mtime of the file, or 0 for the fallback)."""
+        self._refresh()
+        return self._mtime or 0
+
+    def render(self, now=None):
+        self._refresh()
+        parts = self._parts
+        if len(parts) == 1:
+            return parts[0]
+        # Minute precision keeps the prompt byte-identical for a whole minute.
+        stamp = (now or datetime.datetime.now()).strftime("%Y-%m-%d %H:%M")
+        return stamp.join(parts)
+
+
+class PromptRegistry:
+    """Named prompt templates shared across the backend."""
+
+    def __init__(self):
+        self._templates = {}
+
+    def register(self, name, path, fallback=""):
+        template = PromptTemplate(path, fallback)
+        self._templates[name] = template
+        return template
+
+    def get(self, name):
+        return self._templates[name]
+
+
+prompts = PromptRegistry()
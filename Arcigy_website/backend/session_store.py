@@ -0,0 +1,101 @@
+import time
+import threading
+from collections import OrderedDict
+
+
+class ChatSession:
+    """History of one conversation plus its pre-formatted transcript lines, extended turn by turn."""
+
+    __slots__ = ("history", "lines", "touched")
+
+    def __init__(self, history=None):
+        self.history = []
+        self.lines = []
+        self.touched = time.monotonic()
+        for m in history or []:
+            self.add(m.get("type", "unknown"), m.get("text", ""))
+
+    def add(self, kind, text):
+        self.history.append({"type": kind, "text": text})
+        self.lines.append(f"{kind.capitalize()}: {text}")
+
+
+class SessionStore:
+    """
+    Server-side chat history keyed by conversationID, so the browser only has to send
+    the new message. In-memory LRU with a TTL; `backend(conversation_id)` is an optional
+    loader used on a miss (e.g. after a restart) that returns [{"type", "text"}, ...].
+    `on_evict(conversation_id)` is called when a session expires or is pushed out, so
+    other per-conversation state can be dropped with it.
+
+    Sessions live in this process only: with several workers, a conversation whose
+    turns alternate between them would be answered from a stale history. The web
+    app therefore runs as a single worker (main_router refuses WEB_CONCURRENCY > 1).
+    """
+
+    def __init__(self, maxsize=2000, ttl=6 * 3600, backend=None, on_evict=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.backend = backend
+        self.on_evict = on_evict
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evicted(self, conversation_ids):
+        if self.on_evict is None:
+            return
+        for conversation_id in conversation_ids:
+            try:
+                self.on_evict(conversation_id)
+            except Exception as e:
+                print(f"Session evict hook error: {e}")
+
+    def get(self, conversation_id):
+        """Returns the cached session or None. Never touches the backend."""
+        with self._lock:
+            session = self._sessions.get(conversation_id)
+            if session is None:
+                return None
+            expired = time.monotonic() - session.touched > self.ttl
+            if expired:
+                del self._sessions[conversation_id]
+            else:
+                session.touched = time.monotonic()
+                self._sessions.move_to_end(conversation_id)
+        if expired:
+            self._evicted([conversation_id])
+            return None
+        return session
+
+    def _put(self, conversation_id, session):
+        evicted = []
+        with self._lock:
+            self._sessions[conversation_id] = session
+            self._sessions.move_to_end(conversation_id)
+            while len(self._sessions) > self.maxsize:
+                evicted.append(self._sessions.popitem(last=False)[0])
+        self._evicted(evicted)
+        return session
+
+    def load(self, conversation_id):
+        """Returns the session, loading it from the backend (blocking) on a miss."""
+        session = self.get(conversation_id)
+        if session is not None:
+            return session
+        history = []
+        if self.backend is not None:
+            try:
+                history = self.backend(conversation_id) or []
+            except Exception as e:
+                print(f"Session backend error: {e}")
+        return self._put(conversation_id, ChatSession(history))
+
+    def replace(self, conversation_id, history):
+        """Seeds a session from a client-sent history (older clients still send it)."""
+        return self._put(conversation_id, ChatSession(history))
+
+    def append_turn(self, conversation_id, message, response):
+        session = self.get(conversation_id) or self._put(conversation_id, ChatSession())
+        with self._lock:
+            session.add("user", message)
+            session.add("bot", response)
@@ -0,0 +1,136 @@
+"""
+Cold-start helpers: import timing, lazy clients, one-time .env loading and a
+background warm-up.
+
+Importing it has no side effects. The app entry point (main_router) imports it
+first and calls `import_timer.start()`, so every import that follows is timed;
+`startup_report()` stops the timer and breaks startup cost down by module.
+"""
+import os
+import sys
+import time
+import asyncio
+import builtins
+import functools
+import threading
+
+PROCESS_START = time.perf_counter()
+
+
+class ImportTimer:
+    """
+    Measures how long each top-level package takes to import, including whatever it
+    pulls in. Nested and already-loaded imports pass straight through, so the cost
+    is charged to the outermost import; `stop()` restores the builtin once ready.
+    """
+
+    def __init__(self):
+        self.durations = {}
+        self._depth = 0
+        self._original = None
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        if self._depth or level or name in sys.modules:
+            return self._original(name, globals, locals, fromlist, level)
+        self._depth += 1
+        start = time.perf_counter()
+        try:
+            return self._original(name, globals, locals, fromlist, level)
+        finally:
+            self._depth -= 1
+            top = name.split(".", 1)[0]
+            self.durations[top] = self.durations.get(top, 0.0) + time.perf_counter() - start
+
+    def start(self):
+        if self._original is None:
+            self._original = builtins.__import__
+            builtins.__import__ = self._import
+
+    def stop(self):
+        if self._original is not None:
+            builtins.__import__ = self._original
+            self._original = None
+
+    def report(self, top=12):
+        """[(module, seconds)] sorted by cost."""
+        return sorted(self.durations.items(), key=lambda item: item[1], reverse=True)[:top]
+
+
+import_timer = ImportTimer()
+
+
+class Lazy:
+    """
+    Thread-safe lazy value: `factory()` runs once, on the first `get()` (a request
+    or the warm-up), instead of at import time.
+    """
+
+    def __init__(self, factory):
+        self.factory = factory
+        self._lock = threading.Lock()
+        self._value = None
+        self._ready = False
+
+    def get(self):
+        if not self._ready:
+            with self._lock:
+                if not self._ready:
+                    self._value = self.factory()
+                    self._ready = True
+        return self._value
+
+    @property
+    def ready(self):
+        return self._ready
+
+
+@functools.lru_cache(maxsize=None)
+def load_env():
+    """Loads the root .env once per process (every engine calls this; only the first does any work)."""
+    from dotenv import load_dotenv
+
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    # Up 3 levels: backend -> Arcigy_website -> cloud_automations -> Agentic Workflows
+    root_env = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(base_dir))), ".env")
+    if os.path.exists(root_env):
+        load_dotenv(root_env, override=True)
+    else:
+        load_dotenv(override=True)
+    return True
+
+
+def startup_report(metrics=None):
+    """Prints the import breakdown and time-to-ready; also exported as gauges when `metrics` is given."""
+    import_timer.stop()
+    ready_in = time.perf_counter() - PROCESS_START
+    modules = import_timer.report()
+    print(f"🚀 Ready in {ready_in:.2f}s; slowest imports: " + ", ".join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in modules))
+    if metrics is not None:
+        metrics.describe("startup_seconds", "gauge", "Process start to ready (imports and startup hooks)")
+        metrics.describe("startup_import_seconds", "gauge", "Import time of the slowest top-level modules at startup")
+        metrics.gauge_set("startup_seconds", round(ready_in, 4))
+        for name, seconds in modules:
+            metrics.gauge_set("startup_import_seconds", round(seconds, 4), module=name)
+
+
+def schedule_warm_up(*steps):
+    """
+    Runs warm-up steps in the background once the server is up (the startup hook
+    returns immediately, so the port is bound without waiting for them).
+    Sync steps run in a thread, async ones on the loop; failures are only logged.
+    """
+    async def run():
+        await asyncio.sleep(0)
+        loop = asyncio.get_running_loop()
+        for step in steps:
+            start = time.perf_counter()
+            try:
+                if asyncio.iscoroutinefunction(step):
+                    await step()
+                else:
+                    await loop.run_in_executor(None, step)
+                print(f"🔥 Warm-up {step.__name__}: {(time.perf_counter() - start) * 1000:.0f}ms")
+            except Exception as e:
+                print(f"Warm-up {step.__name__} failed: {e}")
+
+    return asyncio.get_running_loop().create_task(run())
@@ -1,54 +1,90 @@
 import os
+import sys
+import re
 import json
 import datetime
-from openai import OpenAI
-from supabase import create_client, Client
-from dotenv import load_dotenv
+from functools import lru_cache
+from startup import Lazy, load_env
+from prompt_registry import prompts
+from conversation_log import TurnLogWriter
+from session_store import SessionStore
+from context_builder import ContextBuilder, get_encoding
+from answer_cache import AnswerCache
+try:
+    from chatbot_tools.phone_utils import normalize_phone
+    from chatbot_tools.metrics import metrics
+    from chatbot_tools.resilience import upstream
+except ImportError:
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+    from chatbot_tools.phone_utils import normalize_phone
+    from chatbot_tools.metrics import metrics
+    from chatbot_tools.resilience import upstream
 
 # Load environment variables from root .env
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-# Up 3 levels: backend -> Arcigy_website -> cloud_automations -> Agentic Workflows
-root_env = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(BASE_DIR))), ".env")
-if os.path.exists(root_env):
-    load_dotenv(root_env, override=True)
-else:
-    load_dotenv(override=True)
+load_env()
 
 # Configurations
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
-# Initialize clients
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY) if SUPABASE_URL and SUPABASE_KEY else None
-openai_client = OpenAI(api_key=OPENAI_API_KEY) if OPENAI_API_KEY else None
+def _create_supabase():
+    if not (SUPABASE_URL and SUPABASE_KEY):
+        return None
+    from supabase import create_client
+    return create_client(SUPABASE_URL, SUPABASE_KEY)
+
+def _create_openai():
+    if not OPENAI_API_KEY:
+        return None
+    from openai import AsyncOpenAI
+    return AsyncOpenAI(api_key=OPENAI_API_KEY)
+
+# Clients (and their SDK imports) are built on first use or by the warm-up, not at import
+_supabase = Lazy(_create_supabase)
+_openai = Lazy(_create_openai)
+
+def get_supabase():
+    return _supabase.get()
+
+def get_openai():
+    return _openai.get()
+
+# Breaker + latency-based timeout for completions (fails fast while OpenAI is down)
+openai_api = upstream("openai", max_timeout=30.0, min_timeout=5.0)
+
+# Append-only turn log; ConversationMemory is compacted from it periodically
+turn_log = TurnLogWriter(get_supabase)
+# Server-side chat history, reloaded from the turn log after a restart
+session_store = SessionStore(backend=turn_log.load_history, on_evict=turn_log.forget)
 
 # Load System Prompt from external file
 # Up 3 levels to reach directives
 PROMPT_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "..", "directives", "tony_prompt.md")
+tony_prompt = prompts.register("tony", PROMPT_PATH, fallback="You are Tony, a helpful AI assistant.")
 
 def load_system_prompt():
-    try:
-        with open(PROMPT_PATH, "r", encoding="utf-8") as f:
-            return f.read()
-    except Exception as e:
-        print(f"Error loading prompt: {e}")
-        return "You are Tony, a helpful AI assistant."
+    """Raw prompt template (cached, reloaded when the file changes)."""
+    return tony_prompt.text
+
+@lru_cache(maxsize=32)
+def _prompt_suffix(lang):
+    # Rendered once per language instead of on every message; bounded because `lang` comes from the client
+    lang_instruction = f"IMPORTANT: Respond in {lang.upper()} language." if lang else ""
+    return f"\n\n{lang_instruction}\nIMPORTANT: Respond ONLY with a raw JSON object. No markdown blocks."
+
+def is_error_output(output):
+    """Failed turns (the apology from _error_output) are kept out of the session and the turn log."""
+    return "error" in output
 
 def persist_conversation(conversation_id, message, output, formatted_history):
     """
     Handles database updates in the background.
     """
     try:
-        # 1. Update Memory
-        conv_data = {
-            "messageID": conversation_id,
-            "conversation": formatted_history + f"\nUser: {message}\nBot: {output['response']}"
-        }
-        try:
-            supabase.table("ConversationMemory").upsert(conv_data, on_conflict="messageID").execute()
-        except Exception as db_err:
-            print(f"Database Warning (Memory): {db_err}")
+        # 1. Append the turn (batched write; memory transcript is compacted from the log)
+        if not is_error_output(output):
+            turn_log.append(conversation_id, message, output.get("response"))
 
         # 2. Update Leads (Patients)
         if all(output.get(key) != "null" for key in ["forname", "surname", "email", "phone"]):
@@ -56,75 +92,238 @@ def persist_conversation(conversation_id, message, output, formatted_history):
                 "forename": output["forname"],
                 "surname": output["surname"],
                 "email": output["email"],
-                "phone": output["phone"]
+                "phone": normalize_phone(output["phone"]) or output["phone"]
             }
             try:
-                supabase.table("Patients").upsert(patient_data, on_conflict="phone").execute()
+                with metrics.timed("supabase", "Patients.upsert"):
+                    get_supabase().table("Patients").upsert(patient_data, on_conflict="phone").execute()
             except Exception as db_err:
                 print(f"Database Warning (Patients): {db_err}")
     except Exception as e:
         print(f"Background Persistence Error: {e}")
 
-def get_tony_response(message, conversation_id, history, user_lang=None):
+def warm_up_clients():
     """
-    Handles the AI reasoning using the external prompt.
+    Builds both clients and the tokenizer, then opens the Supabase connection
+    (run in the background after startup so the first chat doesn't pay for it).
     """
-    try:
-        # 1. Format history
-        formatted_history = ""
-        if isinstance(history, list):
-            formatted_history = "\n".join([f"{m.get('type', 'unknown').capitalize()}: {m.get('text', '')}" for m in history])
-        
-        # 2. Get AI Response
-        system_prompt = load_system_prompt()
-        if "{now}" in system_prompt:
-            system_prompt = system_prompt.replace("{now}", str(datetime.datetime.now()))
-        
-        # Guide the AI on the required language
-        detected_lang = user_lang if user_lang else ('sk' if any(word in message.lower() for word in ['ahoj', 'chcem', 'termin', 'ano', 'dobry']) else 'en')
-        lang_instruction = f"IMPORTANT: Respond in {detected_lang.upper()} language." if detected_lang else ""
-
-        response = openai_client.chat.completions.create(
+    get_encoding()
+    get_openai()
+    client = get_supabase()
+    if client is not None:
+        with metrics.timed("supabase", "warm_up"):
+            client.table("Patients").select("phone").limit(1).execute()
+
+async def warm_up_openai():
+    """Opens the OpenAI connection pool (TLS handshake) with a cheap models call."""
+    client = get_openai()
+    if client is not None:
+        with metrics.timed("openai", "warm_up"):
+            await client.models.list()
+
+def _detect_lang(message, user_lang=None):
+    return user_lang if user_lang else ('sk' if any(word in message.lower() for word in ['ahoj', 'chcem', 'termin', 'ano', 'dobry']) else 'en')
+
+def _history_lines(history):
+    """Accepts formatted lines (session store) or the legacy [{"type", "text"}] list."""
+    if not isinstance(history, list):
+        return []
+    return [m if isinstance(m, str) else f"{m.get('type', 'unknown').capitalize()}: {m.get('text', '')}" for m in history]
+
+async def _summarize_history(previous_summary, lines):
+    with openai_api.guard(budget=15, operation="summarize") as call, metrics.timed("openai", "summarize"):
+        response = await get_openai().chat.completions.create(
             model="gpt-4o-mini",
             messages=[
-                {"role": "system", "content": system_prompt + f"\n\n{lang_instruction}\nIMPORTANT: Respond ONLY with a raw JSON object. No markdown blocks."},
-                {"role": "user", "content": f"HISTÓRIA KONVERZÁCIE:\n{formatted_history}\n\nAKTUÁLNA SPRÁVA OD POUŽÍVATEĽA: {message}"}
+                {"role": "system", "content": "Summarize this sales chat for the assistant's memory in at most 120 words. Keep names, contact details, company, requested services, agreed dates and open questions. Write in the conversation's language."},
+                {"role": "user", "content": f"PREVIOUS SUMMARY:\n{previous_summary or '-'}\n\nNEW MESSAGES:\n" + "\n".join(lines)}
             ],
-            response_format={"type": "json_object"}
+            max_tokens=300,
+            timeout=call.timeout
         )
-        
-        raw_text = response.choices[0].message.content.strip()
-        
-        # Aggressive cleaning for JSON
-        try:
-            output = json.loads(raw_text)
-        except json.JSONDecodeError:
-            # Fallback: Find the first '{' and last '}'
-            start = raw_text.find('{')
-            end = raw_text.rfind('}')
-            if start != -1 and end != -1:
-                output = json.loads(raw_text[start:end+1])
-            else:
-                raise
-        
-        # Determine language (simple heuristic)
-        lang = user_lang if user_lang else ('sk' if any(word in message.lower() for word in ['ahoj', 'chcem', 'termin', 'ano', 'dobry']) else 'en')
-        output['lang'] = lang
-        
+    return response.choices[0].message.content.strip()
+
+# Recent messages verbatim + cached rolling summary of older ones, under a hard token budget
+context_builder = ContextBuilder(summarize=_summarize_history)
+
+# Repeated opening questions (pricing, services, demo) are answered without a completion
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE", "true").lower() != "false"
+answer_cache = AnswerCache(maxsize=int(os.getenv("ANSWER_CACHE_SIZE", 1000)), ttl=int(os.getenv("ANSWER_CACHE_TTL", 3600)))
+
+def _answer_key(message, history, user_lang):
+    """Answer cache key for a first turn (no history to depend on), else None."""
+    if not ANSWER_CACHE_ENABLED or (history if isinstance(history, str) else _history_lines(history)):
+        return None
+    return answer_cache.key(message, _detect_lang(message, user_lang), f"{tony_prompt.version}:gpt-4o-mini")
+
+async def _build_messages(message, conversation_id, history, user_lang=None):
+    """
+    Builds the OpenAI messages for one turn.
+    Returns (messages, formatted_history).
+    """
+    # 1. History window (summary + recent turns)
+    formatted_history = history if isinstance(history, str) else await context_builder.build(conversation_id, _history_lines(history))
+
+    # 2. System prompt (static template prefix first, so OpenAI prompt caching can reuse it)
+    system_prompt = tony_prompt.render()
+
+    # Guide the AI on the required language
+    detected_lang = _detect_lang(message, user_lang)
+
+    messages = [
+        {"role": "system", "content": system_prompt + _prompt_suffix(detected_lang)},
+        {"role": "user", "content": f"HISTÓRIA KONVERZÁCIE:\n{formatted_history}\n\nAKTUÁLNA SPRÁVA OD POUŽÍVATEĽA: {message}"}
+    ]
+    return messages, formatted_history
+
+def _parse_output(raw_text):
+    # Aggressive cleaning for JSON
+    raw_text = raw_text.strip()
+    try:
+        return json.loads(raw_text)
+    except json.JSONDecodeError:
+        # Fallback: Find the first '{' and last '}'
+        start = raw_text.find('{')
+        end = raw_text.rfind('}')
+        if start != -1 and end != -1:
+            return json.loads(raw_text[start:end+1])
+        raise
+
+def _error_output(e):
+    return {
+        "intention": "question",
+        "response": "Prepáč, niečo sa pokazilo. Skús prosím znova.",
+        "error": str(e)
+    }
+
+async def get_tony_response(message, conversation_id, history, user_lang=None):
+    """
+    Handles the AI reasoning using the external prompt.
+    """
+    try:
+        key = _answer_key(message, history, user_lang)
+        cached = answer_cache.get(key) if ANSWER_CACHE_ENABLED else None
+        if cached is not None:
+            return cached, ""
+
+        messages, formatted_history = await _build_messages(message, conversation_id, history, user_lang)
+
+        with openai_api.guard(operation="chat") as call, metrics.timed("openai", "chat"):
+            response = await get_openai().chat.completions.create(
+                model="gpt-4o-mini",
+                messages=messages,
+                response_format={"type": "json_object"},
+                timeout=call.timeout
+            )
+
+        output = _parse_output(response.choices[0].message.content)
+        output['lang'] = _detect_lang(message, user_lang)
+        answer_cache.put(key, output)
+
         return output, formatted_history
 
     except Exception as e:
         import traceback
         print(f"Error in Tony AI: {e}")
         traceback.print_exc()
-        return {
-            "intention": "question",
-            "response": "Prepáč, niečo sa pokazilo. Skús prosím znova.",
-            "error": str(e)
-        }, ""
+        return _error_output(e), ""
+
+class ResponseFieldExtractor:
+    """
+    Pulls the "response" string out of a JSON object that is still being streamed,
+    so its text can be forwarded before the rest of the object has arrived.
+    """
+    _START_RE = re.compile(r'"response"\s*:\s*"')
+
+    def __init__(self):
+        self.buffer = ""
+        self.pos = None  # index of the next undecoded char inside the string value
+        self.done = False
+
+    def feed(self, chunk):
+        """Adds raw model output and returns the newly decoded part of the response text."""
+        self.buffer += chunk
+        if self.done:
+            return ""
+        if self.pos is None:
+            match = self._START_RE.search(self.buffer)
+            if not match:
+                return ""
+            self.pos = match.end()
+
+        out = []
+        buf, i = self.buffer, self.pos
+        while i < len(buf):
+            ch = buf[i]
+            if ch == '"':
+                self.done = True
+                i += 1
+                break
+            if ch != "\\":
+                out.append(ch)
+                i += 1
+                continue
+            # Escapes are only decoded once complete; \uD83D\uDE00 pairs need 12 chars.
+            if i + 1 >= len(buf):
+                break
+            size = 6 if buf[i + 1] == "u" else 2
+            if size == 6 and i + 6 <= len(buf) and 0xD800 <= int(buf[i + 2:i + 6], 16) <= 0xDBFF:
+                size = 12
+            if i + size > len(buf):
+                break
+            out.append(json.loads(f'"{buf[i:i + size]}"'))
+            i += size
+        self.pos = i
+        return "".join(out)
+
+async def stream_tony_response(message, conversation_id, history, user_lang=None):
+    """
+    Streaming variant of get_tony_response. Yields {"event": "delta", "response": text}
+    while the model writes the "response" field, then one
+    {"event": "done", "output": output, "formatted_history": formatted_history}.
+    """
+    try:
+        key = _answer_key(message, history, user_lang)
+        cached = answer_cache.get(key) if ANSWER_CACHE_ENABLED else None
+        if cached is not None:
+            yield {"event": "delta", "response": cached.get("response", "")}
+            yield {"event": "done", "output": cached, "formatted_history": ""}
+            return
+
+        messages, formatted_history = await _build_messages(message, conversation_id, history, user_lang)
+
+        # Times the wait for the first streamed chunk
+        with openai_api.guard(operation="chat.stream") as call, metrics.timed("openai", "chat.stream"):
+            stream = await get_openai().chat.completions.create(
+                model="gpt-4o-mini",
+                messages=messages,
+                response_format={"type": "json_object"},
+                stream=True,
+                timeout=call.timeout
+            )
+
+        extractor = ResponseFieldExtractor()
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            text = extractor.feed(chunk.choices[0].delta.content or "")
+            if text:
+                yield {"event": "delta", "response": text}
+
+        output = _parse_output(extractor.buffer)
+        output['lang'] = _detect_lang(message, user_lang)
+        answer_cache.put(key, output)
+        yield {"event": "done", "output": output, "formatted_history": formatted_history}
+
+    except Exception as e:
+        import traceback
+        print(f"Error in Tony AI (stream): {e}")
+        traceback.print_exc()
+        yield {"event": "done", "output": _error_output(e), "formatted_history": ""}
 
 if __name__ == "__main__":
+    import asyncio
     # Local Test
     test_msg = "Ahoj, ja som Branislav Laubert, moj email je branislav@arcigy.com a tel cislo +421912345678. Chcem demo."
-    result = get_tony_response(test_msg, "test_conv_123", [])
+    result = asyncio.run(get_tony_response(test_msg, "test_conv_123", []))
     print(json.dumps(result, indent=2))
@@ -0,0 +1,159 @@
+import time
+import uuid
+import queue
+import smtplib
+import threading
+from collections import OrderedDict
+
+_DONE = object()
+
+
+class RateLimiter:
+    """Thread-safe token bucket: at most `per_minute` acquisitions per rolling minute."""
+
+    def __init__(self, per_minute):
+        self.capacity = max(1, per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def send_batch(jobs, connect, connections=3, per_minute=60, max_attempts=2, on_sent=None):
+    """
+    Sends many messages over a few reused SMTP connections and yields one result
+    per message as soon as it is known, in completion order.
+
+    `jobs` is an iterable of (key, message_or_builder); a builder is called on the
+    worker thread, so rendering happens in parallel and lazily. Results are
+    {"key", "to", "status": "sent" | "failed", "attempts", "error"}.
+    `on_sent(msg)` runs on the worker after each successful send (e.g. Sent archiving).
+    """
+    limiter = RateLimiter(per_minute)
+    todo = queue.Queue(maxsize=connections * 4)  # bounded: the iterable is consumed as we go
+    results = queue.Queue()
+
+    def worker():
+        server = None
+        while True:
+            job = todo.get()
+            if job is _DONE:
+                break
+            key, item = job
+            result = {"key": key, "to": None, "status": "failed", "attempts": 0, "error": None}
+            try:
+                msg = item() if callable(item) else item
+                result["to"] = msg["To"]
+            except Exception as e:
+                result["error"] = f"build failed: {e}"
+                results.put(result)
+                continue
+            for attempt in range(1, max_attempts + 1):
+                result["attempts"] = attempt
+                try:
+                    limiter.acquire()
+                    if server is None:
+                        server = connect()
+                    server.send_message(msg)
+                    result.update(status="sent", error=None)
+                    if on_sent is not None:
+                        try:
+                            on_sent(msg)
+                        except Exception as e:
+                            print(f"Post-send hook error ({key}): {e}")
+                    break
+                except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused) as e:
+                    result["error"] = str(e)
+                    break
+                except Exception as e:
+                    result["error"] = str(e)
+                    try:
+                        server.quit()
+                    except Exception:
+                        pass
+                    server = None
+            results.put(result)
+        if server is not None:
+            try:
+                server.quit()
+            except Exception:
+                pass
+        results.put(_DONE)
+
+    threads = [threading.Thread(target=worker, name=f"batch-mail-{i}", daemon=True) for i in range(connections)]
+    for t in threads:
+        t.start()
+
+    def feed():
+        try:
+            for job in jobs:
+                todo.put(job)
+        finally:
+            for _ in threads:
+                todo.put(_DONE)
+
+    threading.Thread(target=feed, name="batch-mail-feed", daemon=True).start()
+
+    finished = 0
+    while finished < len(threads):
+        result = results.get()
+        if result is _DONE:
+            finished += 1
+        else:
+            yield result
+
+
+class BatchJobs:
+    """
+    Runs batches (e.g. `send_batch` results) on a background thread, detached from
+    the request that started them, and keeps their progress for `status(job_id)`.
+    Only the last `max_jobs` jobs are remembered.
+    """
+
+    def __init__(self, max_jobs=100):
+        self.max_jobs = max_jobs
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def start(self, results, total=None, **info):
+        """Consumes the `results` iterable in the background; returns the job id at once."""
+        job_id = uuid.uuid4().hex
+        job = dict(info, id=job_id, status="running", total=total, sent=0, failed=0, results=[],
+                   error=None, started_at=time.time(), finished_at=None)
+        with self._lock:
+            self._jobs[job_id] = job
+            while len(self._jobs) > self.max_jobs:
+                self._jobs.popitem(last=False)
+
+        def run():
+            try:
+                for result in results:
+                    with self._lock:
+                        job["results"].append(result)
+                        job["sent" if result.get("status") == "sent" else "failed"] += 1
+                status, error = "done", None
+            except Exception as e:
+                print(f"Batch job error ({job_id}): {e}")
+                status, error = "failed", str(e)
+            with self._lock:
+                job.update(status=status, error=error, finished_at=time.time())
+
+        threading.Thread(target=run, name=f"batch-job-{job_id[:8]}", daemon=True).start()
+        return job_id
+
+    def status(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job, results=list(job["results"])) if job else None
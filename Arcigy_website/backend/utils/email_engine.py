@@ -1,32 +1,52 @@
 import os
+import sys
 import smtplib
 import json
 import imaplib
 import time
+import functools
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from email.mime.image import MIMEImage
-from dotenv import load_dotenv
-
-# Load environment variables
-load_dotenv()
-
-# SMTP Config
-SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.hostinger.com")
-SMTP_PORT = int(os.getenv("SMTP_PORT", 465))
-
-email_acc = os.getenv("EMAIL_ACCOUNT_BRANISLAV")
-if email_acc and ":" in email_acc:
-    email_acc = email_acc.strip('"\'')
-    parts = email_acc.split(":", 1)
-    SMTP_USER = parts[0].strip()
-    SMTP_PASS = parts[1].strip()
-else:
-    SMTP_USER = os.getenv("SMTP_USER", "branislav@arcigy.com")
-    SMTP_PASS = os.getenv("SMTP_PASS")
+try:
+    from utils.mail_queue import MailQueue
+    from utils.sent_archiver import SentArchiver
+    from utils.template_cache import TemplateCache, CachedImagePart
+    from utils.batch_sender import send_batch, BatchJobs
+except ImportError:
+    from mail_queue import MailQueue
+    from sent_archiver import SentArchiver
+    from template_cache import TemplateCache, CachedImagePart
+    from batch_sender import send_batch, BatchJobs
+try:
+    from chatbot_tools.metrics import metrics
+    from chatbot_tools.log import log
+except ImportError:
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", ".."))
+    from chatbot_tools.metrics import metrics
+    from chatbot_tools.log import log
+try:
+    from startup import load_env
+except ImportError:
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+    from startup import load_env
 
+@functools.lru_cache(maxsize=None)
+def smtp_settings():
+    """(server, port, user, password), read from the environment on first use instead of at import."""
+    load_env()
+    server = os.getenv("SMTP_SERVER", "smtp.hostinger.com")
+    port = int(os.getenv("SMTP_PORT", 465))
+
+    email_acc = os.getenv("EMAIL_ACCOUNT_BRANISLAV")
+    if email_acc and ":" in email_acc:
+        email_acc = email_acc.strip('"\'')
+        parts = email_acc.split(":", 1)
+        return server, port, parts[0].strip(), parts[1].strip()
+    return server, port, os.getenv("SMTP_USER", "branislav@arcigy.com"), os.getenv("SMTP_PASS")
+
+@functools.lru_cache(maxsize=None)
 def get_paths():
-    """Helper to get correct paths relative to Arcigy_website root."""
+    """Helper to get correct paths relative to Arcigy_website root (resolved once)."""
     
     # 1. Try file-relative path first (most reliable if file structure is intact)
     # email_engine.py is in .../Arcigy_website/backend/utils/
@@ -51,27 +71,26 @@ def get_paths():
     template_path = os.path.join(base_dir, "templates", "premium_email.html")
     asset_path = os.path.join(base_dir, "assets", "cyber_socials_layout.jpg")
     
-    print(f"DEBUG PATHS:")
-    print(f"  Base Dir: {base_dir}")
-    print(f"  Template Target: {template_path}")
-    print(f"  Asset Target: {asset_path}")
+    log.debug("email_paths", base_dir=base_dir, template=template_path, asset=asset_path)
 
     return template_path, asset_path
 
+TEMPLATE_NAME = "premium_email.html"
+FALLBACK_TEMPLATE = "<html><body><h2>Error: Template not found</h2><p>{{ greeting }}</p><p>{{ details }}</p><br><a href='{{ confirm_url }}'>Potvrdiť</a></body></html>"
+
+_template_path, _asset_path = get_paths()
+# Compiled once; recompiled / re-encoded only when the files change
+email_templates = TemplateCache(os.path.dirname(_template_path), fallbacks={TEMPLATE_NAME: FALLBACK_TEMPLATE})
+socials_image = CachedImagePart(_asset_path, "cyber_socials_layout")
+
 def get_template():
-    """Loads the premium HTML template from the fixed location."""
-    template_path, _ = get_paths()
-    
-    # Try reading directly
-    try:
-        if os.path.exists(template_path):
-            with open(template_path, 'r', encoding='utf-8') as f:
-                return f.read()
-    except Exception as e:
-        print(f"Error reading template: {e}")
-            
-    print(f"CRITICAL: Template file missing at {template_path}")
-    return "<html><body><h2>Error: Template not found</h2><p>{greeting}</p><p>{details}</p><br><a href='{confirm_url}'>Potvrdiť</a></body></html>"
+    """Returns the compiled premium HTML template (Jinja2)."""
+    return email_templates.get(TEMPLATE_NAME)
+
+def warm_up_templates():
+    """Compiles the email template and encodes the inline image ahead of the first email."""
+    get_template()
+    socials_image.get()
 
 def format_datetime(iso_string, lang='sk'):
     """Converts ISO 8601 to a pretty readable format."""
@@ -91,103 +110,159 @@ def format_datetime(iso_string, lang='sk'):
     except:
         return iso_string
 
-def send_confirmation_email(to_email, name, action_type, details, confirm_url, lang='sk'):
-    """Sends a premium confirmation email with CID embedded images."""
+def build_confirmation_email(to_email, name, action_type, details, confirm_url, lang='sk'):
+    """Builds the premium confirmation email (with CID embedded images) as a MIME message."""
+    pretty_date = format_datetime(details, lang)
+    
+    if lang == 'sk':
+        subjects = {
+            "book": "Potvrdenie termínu | ArciGy",
+            "cancel": "Zrušenie termínu | ArciGy",
+            "reschedule": "Presun termínu | ArciGy",
+            "reminder": "Pripomienka termínu | ArciGy",
+            "followup": "Ďakujeme za stretnutie | ArciGy"
+        }
+        greetings = f"Dobrý deň,<br class='m-br' style='display:none;'> {name}!"
+        descriptions = {
+            "book": f"Váš nový termín na diagnostiku je:<br><b>{pretty_date}</b>.",
+            "cancel": f"Dostali sme požiadavku na zrušenie termínu:<br><b>{pretty_date}</b>.",
+            "reschedule": f"Váš termín bol presunutý na:<br><b>{pretty_date}</b>.",
+            "reminder": f"Pripomíname Váš termín na diagnostiku:<br><b>{pretty_date}</b>.",
+            "followup": f"Ďakujeme za diagnostiku dňa<br><b>{pretty_date}</b>."
+        }
+        button_labels = {"reminder": "Zobraziť termín", "followup": "Ďalší krok"}
+    else:
+        subjects = {
+            "book": "Booking Confirmation | ArciGy",
+            "cancel": "Cancellation | ArciGy",
+            "reschedule": "Rescheduling | ArciGy",
+            "reminder": "Appointment Reminder | ArciGy",
+            "followup": "Thank you for meeting us | ArciGy"
+        }
+        greetings = f"Hello,<br class='m-br' style='display:none;'> {name}!"
+        descriptions = {
+            "book": f"Your new diagnostic appointment is set for: <b>{pretty_date}</b>.",
+            "cancel": f"We received a request to cancel your appointment: <b>{pretty_date}</b>.",
+            "reschedule": f"Your appointment has been rescheduled to: <b>{pretty_date}</b>.",
+            "reminder": f"A reminder of your diagnostic appointment: <b>{pretty_date}</b>.",
+            "followup": f"Thank you for the diagnostic session on <b>{pretty_date}</b>."
+        }
+        button_labels = {"reminder": "View appointment", "followup": "Next step"}
+
+    email_id = str(int(time.time()))
+    
+    # Fill the template slots
+    button_label = button_labels.get(action_type, "Potvrdiť termín")
+    html_content = get_template().render(greeting=greetings, details=descriptions.get(action_type, ""), confirm_url=confirm_url, email_id=email_id, button_label=button_label)
+    
+    # Create plain text version
+    desc_text = descriptions.get(action_type, "").replace('<b>', '').replace('</b>', '').replace('<br>', '\n')
+    text_content = f"{greetings.replace('<br>', ' ')}\n\n{desc_text}\n\n{button_label}: {confirm_url}"
+    
+    # Create message
+    msg = MIMEMultipart('related')
+    msg['From'] = f"ArciGy Automation <{smtp_settings()[2]}>"
+    msg['To'] = to_email
+    msg['Subject'] = subjects.get(action_type, "Potvrdenie terminu")
+
+    msg_alt = MIMEMultipart('alternative')
+    msg_alt.attach(MIMEText(text_content, 'plain'))
+    msg_alt.attach(MIMEText(html_content, 'html'))
+    msg.attach(msg_alt)
+
+    # Attach Images (CID) - pre-encoded part shared by all messages
     try:
-        print(f"\n🔧 EMAIL ENGINE DEBUG:")
-        template_path, asset_path = get_paths()
-        
-        html = get_template()
-        print(f"   Template loaded: {len(html)} chars")
-        
-        if not os.path.exists(asset_path):
-             # Try absolute fallback
-             print(f"   ❌ WARNING: Image asset not found at {asset_path}")
-        else:
-            print(f"   ✅ Image asset found at {asset_path}")
+        img = socials_image.get()
+        if img is not None:
+            msg.attach(img)
+    except Exception as img_err:
+        log.warning("email_image_attach_failed", to=to_email, error=img_err)
 
-        pretty_date = format_datetime(details, lang)
-        
-        if lang == 'sk':
-            subjects = {
-                "book": "Potvrdenie termínu | ArciGy",
-                "cancel": "Zrušenie termínu | ArciGy",
-                "reschedule": "Presun termínu | ArciGy"
-            }
-            greetings = f"Dobrý deň,<br class='m-br' style='display:none;'> {name}!"
-            descriptions = {
-                "book": f"Váš nový termín na diagnostiku je:<br><b>{pretty_date}</b>.",
-                "cancel": f"Dostali sme požiadavku na zrušenie termínu:<br><b>{pretty_date}</b>.",
-                "reschedule": f"Váš termín bol presunutý na:<br><b>{pretty_date}</b>."
-            }
-        else:
-            subjects = {
-                "book": "Booking Confirmation | ArciGy",
-                "cancel": "Cancellation | ArciGy",
-                "reschedule": "Rescheduling | ArciGy"
-            }
-            greetings = f"Hello,<br class='m-br' style='display:none;'> {name}!"
-            descriptions = {
-                "book": f"Your new diagnostic appointment is set for: <b>{pretty_date}</b>.",
-                "cancel": f"We received a request to cancel your appointment: <b>{pretty_date}</b>.",
-                "reschedule": f"Your appointment has been rescheduled to: <b>{pretty_date}</b>."
-            }
-
-        email_id = str(int(time.time()))
-        
-        # Inject variables into HTML
-        html_content = html.replace("{greeting}", greetings).replace("{details}", descriptions.get(action_type, "")).replace("{confirm_url}", confirm_url).replace("{email_id}", email_id)
-        
-        # Create plain text version
-        desc_text = descriptions.get(action_type, "").replace('<b>', '').replace('</b>', '').replace('<br>', '\n')
-        text_content = f"{greetings.replace('<br>', ' ')}\n\n{desc_text}\n\nPotvrdiť termín: {confirm_url}"
-        
-        # Create message
-        msg = MIMEMultipart('related')
-        msg['From'] = f"ArciGy Automation <{SMTP_USER}>"
-        msg['To'] = to_email
-        msg['Subject'] = subjects.get(action_type, "Potvrdenie terminu")
-
-        msg_alt = MIMEMultipart('alternative')
-        msg_alt.attach(MIMEText(text_content, 'plain'))
-        msg_alt.attach(MIMEText(html_content, 'html'))
-        msg.attach(msg_alt)
-
-        # Attach Images (CID)
-        if os.path.exists(asset_path):
-            try:
-                with open(asset_path, 'rb') as f:
-                    img = MIMEImage(f.read())
-                    img.add_header('Content-ID', '<cyber_socials_layout>')
-                    msg.attach(img)
-                print("   ✅ Image attached to email successfully.")
-            except Exception as img_err:
-                 print(f"   ❌ Failed to attach image: {img_err}")
-        else:
-            print("   ❌ Image NOT attached (file missing).")
+    return msg
+
+def smtp_connect():
+    """Opens an authenticated SMTP session (sends on it are timed for /metrics)."""
+    host, port, user, password = smtp_settings()
+    with metrics.timed("smtp", "connect"):
+        server = smtplib.SMTP_SSL(host, port, timeout=30)
+        server.login(user, password)
+    return metrics.instrument(server, "smtp", ("send_message",))
+
+def imap_connect():
+    """Opens an authenticated IMAP session for archiving sent mail."""
+    imap_host = os.getenv("EMAIL_HOST_IMAP", "imap.hostinger.com")
+    imap_port = int(os.getenv("EMAIL_PORT_IMAP", 993))
+    _, _, user, password = smtp_settings()
+    with metrics.timed("imap", "connect"):
+        mail = imaplib.IMAP4_SSL(imap_host, imap_port, timeout=30)
+        mail.login(user, password)
+    return metrics.instrument(mail, "imap", ("append",))
+
+# Sent-folder copies are spooled locally and appended in batches over one IMAP session
+MAIL_SPOOL_DIR = os.getenv("MAIL_SPOOL_DIR") or os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), ".mail_spool")
+sent_archiver = SentArchiver(imap_connect, MAIL_SPOOL_DIR)
+
+def save_to_sent(msg):
+    """Queues a sent message for the IMAP 'INBOX.Sent' folder (see SentArchiver)."""
+    try:
+        sent_archiver.archive(msg)
+    except Exception as e:
+        print(f"Sent archive spool error: {e}")
+
+# Outbound queue: one long-lived SMTP session, reconnect + retry with backoff
+mail_queue = MailQueue(smtp_connect)
+
+def queue_confirmation_email(to_email, name, action_type, details, confirm_url, lang='sk', on_failed=None):
+    """
+    Builds the confirmation email and hands it to the outbound queue.
+    Returns a delivery id (poll it with mail_queue.status) or None if it could not be queued.
+    `on_failed(msg, error)` runs if the queued email later fails for good.
+    """
+    try:
+        msg = build_confirmation_email(to_email, name, action_type, details, confirm_url, lang)
+    except Exception as e:
+        log.error("email_template_failed", to=to_email, action=action_type, error=e)
+        return None
+    return mail_queue.submit(msg, on_sent=save_to_sent, on_failed=on_failed)
+
+def send_confirmation_email(to_email, name, action_type, details, confirm_url, lang='sk'):
+    """Sends a premium confirmation email with CID embedded images (synchronously)."""
+    try:
+        msg = build_confirmation_email(to_email, name, action_type, details, confirm_url, lang)
 
         # SMTP SEND
         try:
-            with smtplib.SMTP_SSL(SMTP_SERVER, SMTP_PORT) as server:
-                server.login(SMTP_USER, SMTP_PASS)
+            with smtp_connect() as server:
                 server.send_message(msg)
             
             # Save to Sent
-            try:
-                imap_host = os.getenv("EMAIL_HOST_IMAP", "imap.hostinger.com")
-                imap_port = int(os.getenv("EMAIL_PORT_IMAP", 993))
-                mail = imaplib.IMAP4_SSL(imap_host, imap_port)
-                mail.login(SMTP_USER, SMTP_PASS)
-                mail.append("INBOX.Sent", '\\Seen', imaplib.Time2Internaldate(time.time()), msg.as_bytes())
-                mail.logout()
-            except: pass
-
-            print("   ✅ Email sent successfully via SMTP.")
+            save_to_sent(msg)
+
+            log.info("email_sent", to=to_email, action=action_type)
             return True
         except Exception as e:
-            print(f"CRITICAL Email Error: {e}")
+            log.error("email_send_failed", to=to_email, action=action_type, error=e)
             return False
             
     except Exception as e:
-        print(f"CRITICAL Template Error: {e}")
+        log.error("email_template_failed", to=to_email, action=action_type, error=e)
         return False
+
+# Bulk sends run detached from the request that started them; progress via batch_jobs.status()
+batch_jobs = BatchJobs()
+
+def send_bulk_emails(recipients, action_type="reminder", connections=3, per_minute=60):
+    """
+    Sends one templated email per recipient (reminders, follow-ups) over a few reused
+    SMTP connections, rate limited per minute. Yields a result dict per recipient as
+    it completes. Recipients are dicts: {"email", "name", "time", "url", "lang"}.
+    """
+    def jobs():
+        for r in recipients:
+            build = functools.partial(
+                build_confirmation_email,
+                r["email"], r.get("name", ""), action_type, r.get("time"), r.get("url", ""), r.get("lang", "sk")
+            )
+            yield r["email"], build
+
+    yield from send_batch(jobs(), smtp_connect, connections=connections, per_minute=per_minute, on_sent=save_to_sent)
@@ -0,0 +1,144 @@
+import time
+import uuid
+import queue
+import smtplib
+import threading
+from collections import OrderedDict
+
+
+class MailQueue:
+    """
+    Outbound email queue drained by background workers.
+
+    Each worker keeps one authenticated SMTP session open and reuses it for every
+    message, reconnecting when the server drops it. Failed sends are retried with
+    exponential backoff. Callers get a delivery id back immediately and can poll
+    `status(delivery_id)`; `on_failed(msg, error)` lets them undo side effects
+    (e.g. a slot hold) once a message has failed for good.
+    """
+
+    def __init__(self, connect, workers=1, maxsize=500, max_attempts=4, backoff=2.0, idle_timeout=60.0, max_statuses=5000):
+        self.connect = connect  # () -> logged-in smtplib.SMTP
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.idle_timeout = idle_timeout
+        self.max_statuses = max_statuses
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._statuses = OrderedDict()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._stopping = threading.Event()
+
+    def _set_status(self, delivery_id, **fields):
+        with self._lock:
+            entry = self._statuses.get(delivery_id)
+            if entry is None:
+                entry = self._statuses[delivery_id] = {"id": delivery_id}
+                while len(self._statuses) > self.max_statuses:
+                    self._statuses.popitem(last=False)
+            entry.update(fields, updated_at=time.time())
+
+    def status(self, delivery_id):
+        with self._lock:
+            entry = self._statuses.get(delivery_id)
+            return dict(entry) if entry else None
+
+    def submit(self, msg, on_sent=None, on_failed=None):
+        """Queues a message. Returns its delivery id, or None when the queue is full (on_failed is not called then)."""
+        self.start()
+        delivery_id = uuid.uuid4().hex
+        self._set_status(delivery_id, status="queued", attempts=0, to=msg["To"])
+        try:
+            self._queue.put_nowait((delivery_id, msg, on_sent, on_failed))
+        except queue.Full:
+            print(f"Mail queue full, rejecting message to {msg['To']}")
+            with self._lock:
+                self._statuses.pop(delivery_id, None)
+            return None
+        return delivery_id
+
+    def _worker(self):
+        server = None
+        last_used = 0.0
+        while not self._stopping.is_set() or not self._queue.empty():
+            try:
+                delivery_id, msg, on_sent, on_failed = self._queue.get(timeout=1.0)
+            except queue.Empty:
+                if server is not None and time.monotonic() - last_used > self.idle_timeout:
+                    server = self._close(server)
+                continue
+
+            self._set_status(delivery_id, status="sending")
+            sent = False
+            error = None
+            for attempt in range(1, self.max_attempts + 1):
+                try:
+                    reused = server is not None
+                    if server is None:
+                        server = self.connect()
+                    try:
+                        server.send_message(msg)
+                    except smtplib.SMTPServerDisconnected:
+                        if not reused:
+                            raise
+                        # The kept-open session went stale: reconnect once right away, no backoff
+                        server = self._close(server)
+                        server = self.connect()
+                        server.send_message(msg)
+                    last_used = time.monotonic()
+                    sent = True
+                    self._set_status(delivery_id, status="sent", attempts=attempt, error=None)
+                    break
+                except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused) as e:
+                    # Permanent: retrying won't help
+                    error = e
+                    self._set_status(delivery_id, status="failed", attempts=attempt, error=str(e))
+                    break
+                except Exception as e:
+                    error = e
+                    server = self._close(server)
+                    self._set_status(delivery_id, attempts=attempt, error=str(e))
+                    if attempt == self.max_attempts:
+                        print(f"CRITICAL Email Error ({delivery_id}): {e}")
+                        self._set_status(delivery_id, status="failed")
+                    else:
+                        time.sleep(self.backoff * 2 ** (attempt - 1))
+
+            if sent and on_sent is not None:
+                try:
+                    on_sent(msg)
+                except Exception as e:
+                    print(f"Post-send hook error ({delivery_id}): {e}")
+            elif not sent and on_failed is not None:
+                try:
+                    on_failed(msg, error)
+                except Exception as e:
+                    print(f"Failure hook error ({delivery_id}): {e}")
+        self._close(server)
+
+    @staticmethod
+    def _close(server):
+        if server is not None:
+            try:
+                server.quit()
+            except Exception:
+                pass
+        return None
+
+    def start(self):
+        with self._lock:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            if self._threads:
+                return
+            self._stopping.clear()
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"mail-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout=30.0):
+        """Sends what is still queued, then closes the SMTP sessions."""
+        self._stopping.set()
+        for thread in self._threads:
+            thread.join(timeout)
@@ -0,0 +1,130 @@
+import os
+import time
+import uuid
+import imaplib
+import threading
+
+
+class SentArchiver:
+    """
+    Copies sent messages to the IMAP "Sent" folder off the send path.
+
+    `archive()` only writes the message to a local spool directory. A background
+    thread appends spooled messages in batches over one long-lived IMAP connection
+    and deletes each file once the server has accepted it, so nothing is lost while
+    IMAP is down (or across restarts); it is retried with backoff instead.
+    A message the server rejects outright (APPEND "NO"/"BAD") is moved to
+    `failed/` inside the spool, so it cannot hold up the rest of the queue.
+    """
+
+    def __init__(self, connect, spool_dir, folder="INBOX.Sent", batch_size=20, flush_interval=5.0, max_backoff=300.0, idle_timeout=120.0):
+        self.connect = connect  # () -> logged-in imaplib.IMAP4
+        self.spool_dir = spool_dir
+        self.folder = folder
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_backoff = max_backoff
+        self.idle_timeout = idle_timeout
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def archive(self, msg):
+        """Spools a sent message for archiving. Cheap: one local file write."""
+        os.makedirs(self.spool_dir, exist_ok=True)
+        name = f"{time.time_ns()}-{uuid.uuid4().hex}.eml"
+        tmp_path = os.path.join(self.spool_dir, f".{name}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(msg.as_bytes())
+        # Rename is atomic, so the worker never picks up a half-written file
+        os.replace(tmp_path, os.path.join(self.spool_dir, name))
+        self.start()
+        self._wake.set()
+
+    def pending(self):
+        try:
+            return sorted(n for n in os.listdir(self.spool_dir) if n.endswith(".eml"))
+        except FileNotFoundError:
+            return []
+
+    def _reject(self, name, reason):
+        """Moves a message the server will never accept out of the queue."""
+        failed_dir = os.path.join(self.spool_dir, "failed")
+        os.makedirs(failed_dir, exist_ok=True)
+        os.replace(os.path.join(self.spool_dir, name), os.path.join(failed_dir, name))
+        print(f"IMAP archive: {name} rejected, moved to {failed_dir}: {reason}")
+
+    def _append_batch(self, conn, names):
+        for name in names:
+            path = os.path.join(self.spool_dir, name)
+            with open(path, "rb") as f:
+                data = f.read()
+            try:
+                sent_at = int(name.split("-", 1)[0]) / 1e9
+                typ, resp = conn.append(self.folder, "\\Seen", imaplib.Time2Internaldate(sent_at), data)
+            except imaplib.IMAP4.abort:
+                raise  # connection-level: transient, retried with backoff
+            except (imaplib.IMAP4.error, ValueError) as e:
+                # "BAD" (malformed message) or an unparseable spool name: retrying won't help
+                self._reject(name, e)
+                continue
+            if typ != "OK":
+                # "NO": the server refused this message; the connection is still usable
+                self._reject(name, resp)
+                continue
+            os.remove(path)
+
+    def _run(self):
+        conn = None
+        last_used = 0.0
+        backoff = self.flush_interval
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            names = self.pending()
+            if not names:
+                if conn is not None and time.monotonic() - last_used > self.idle_timeout:
+                    conn = self._close(conn)
+                if self._stopping.is_set():
+                    break
+                continue
+            try:
+                if conn is None:
+                    conn = self.connect()
+                for i in range(0, len(names), self.batch_size):
+                    self._append_batch(conn, names[i:i + self.batch_size])
+                last_used = time.monotonic()
+                backoff = self.flush_interval
+            except Exception as e:
+                print(f"IMAP archive error ({len(self.pending())} spooled): {e}")
+                conn = self._close(conn)
+                if self._stopping.is_set():
+                    break
+                # Spooled files stay on disk; try again later
+                self._stopping.wait(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+        self._close(conn)
+
+    @staticmethod
+    def _close(conn):
+        if conn is not None:
+            try:
+                conn.logout()
+            except Exception:
+                pass
+        return None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run, name="imap-archiver", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout=15.0):
+        """Tries one last flush; anything left stays spooled for the next start."""
+        self._stopping.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
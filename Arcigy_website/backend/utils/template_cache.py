@@ -0,0 +1,83 @@
+import os
+import time
+import threading
+from email.mime.image import MIMEImage
+
+
+class TemplateCache:
+    """
+    Compiled Jinja2 email templates. Each template is parsed once and recompiled
+    only when its file's mtime changes (Jinja's auto_reload), so rendering a
+    message is just filling the slots.
+
+    Jinja2 is imported and the environment built on first use, not at import.
+    """
+
+    def __init__(self, templates_dir, fallbacks=None):
+        self.templates_dir = templates_dir
+        self.fallbacks = fallbacks or {}
+        self._env = None
+        self._env_lock = threading.Lock()
+        self._fallback_compiled = {}
+
+    @property
+    def env(self):
+        if self._env is None:
+            with self._env_lock:
+                if self._env is None:
+                    from jinja2 import Environment, FileSystemLoader
+                    # autoescape off: the slots carry trusted HTML fragments (<br>, <b>)
+                    self._env = Environment(loader=FileSystemLoader(self.templates_dir), auto_reload=True, autoescape=False)
+        return self._env
+
+    def get(self, name):
+        try:
+            return self.env.get_template(name)
+        except Exception as e:
+            print(f"CRITICAL: Template {name} unavailable in {self.templates_dir}: {e}")
+            compiled = self._fallback_compiled.get(name)
+            if compiled is None:
+                from jinja2 import Template
+                compiled = self._fallback_compiled[name] = Template(self.fallbacks.get(name, ""))
+            return compiled
+
+    def render(self, name, **slots):
+        return self.get(name).render(**slots)
+
+
+class CachedImagePart:
+    """
+    An inline (CID) image read and base64-encoded once into a MIMEImage part.
+    The same part is attached to every message; it is rebuilt only when the
+    file's mtime changes (checked at most once per `check_interval` seconds).
+    """
+
+    def __init__(self, path, content_id, check_interval=5.0):
+        self.path = path
+        self.content_id = content_id
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._checked_at = float("-inf")
+        self._part = None
+
+    def get(self):
+        """Returns the encoded MIME part, or None if the image is missing."""
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return self._part
+        with self._lock:
+            self._checked_at = now
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except OSError:
+                if self._part is not None or self._mtime is None:
+                    print(f"   ❌ WARNING: Image asset not found at {self.path}")
+                self._mtime, self._part = -1, None
+                return None
+            if mtime != self._mtime:
+                with open(self.path, "rb") as f:
+                    part = MIMEImage(f.read())
+                part.add_header("Content-ID", f"<{self.content_id}>")
+                self._mtime, self._part = mtime, part
+            return self._part
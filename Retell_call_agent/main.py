@@ -1,13 +1,36 @@
 from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse
 import uvicorn
+import asyncio
 import json
 import os
 import sys
-import requests
+import uuid
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 from enum import Enum
 from typing import Optional, Dict, Any
+try:
+    from chatbot_tools import http_client
+    from chatbot_tools.slot_cache import slot_cache
+    from chatbot_tools.patient_cache import patient_cache
+    from chatbot_tools.phone_utils import normalize_phone
+    from chatbot_tools.service_matcher import ServiceMatcher
+    from chatbot_tools.idempotency import booking_requests, idempotency_key
+    from chatbot_tools.slot_holds import SlotHolds, slot_ts
+    from chatbot_tools.metrics import metrics, MetricsMiddleware
+    from chatbot_tools.log import log, LogContextMiddleware
+except ImportError:
+    sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+    from chatbot_tools import http_client
+    from chatbot_tools.slot_cache import slot_cache
+    from chatbot_tools.patient_cache import patient_cache
+    from chatbot_tools.phone_utils import normalize_phone
+    from chatbot_tools.service_matcher import ServiceMatcher
+    from chatbot_tools.idempotency import booking_requests, idempotency_key
+    from chatbot_tools.slot_holds import SlotHolds, slot_ts
+    from chatbot_tools.metrics import metrics, MetricsMiddleware
+    from chatbot_tools.log import log, LogContextMiddleware
 
 load_dotenv()
 
@@ -16,7 +39,7 @@ SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
 CAL_API_KEY = os.getenv("CAL_API_KEY", "cal_live_6101fbb825f9173a4f3e7045d20d5bdc")
 CAL_EVENT_TYPE_ID = os.getenv("CAL_EVENT_TYPE_ID", "3877498")
-CAL_BASE_URL = "https://api.cal.com/v1"
+CAL_BASE_URL = os.getenv("CAL_BASE_URL", "https://api.cal.com/v1")
 
 # --- SERVICES CONFIGURATION ---
 class ServiceType(str, Enum):
@@ -41,7 +64,7 @@ SERVICES_DB: Dict[str, Dict[str, Any]] = {
         "price": "45–80 €",
         "duration_min": 60,
         "category": "Preventívna stomatológia",
-        "aliases": ["hygiena", "dentálna hygiena", "čistenie zubov", "scaling"]
+        "aliases": ["hygiena", "dentálna hygiena", "čistenie zubov", "čistenie", "scaling"]
     },
     "Kompozitná výplň": {
         "price": "60–120 €",
@@ -84,42 +107,44 @@ SERVICES_DB: Dict[str, Dict[str, Any]] = {
     }
 }
 
+SERVICE_MATCHER = ServiceMatcher(SERVICES_DB)
+# Short holds on offered slots, shared with the website when SLOT_HOLDS_DB_PATH points to the same file
+SLOT_HOLD_OFFERED = int(os.getenv("SLOT_HOLD_OFFERED", 3))
+slot_holds = SlotHolds(ttl=int(os.getenv("SLOT_HOLD_TTL", 180)), db_path=os.getenv("SLOT_HOLDS_DB_PATH"))
+
 def validate_service(service_name: str) -> Optional[str]:
-    if not service_name: return None
-    s_lower = service_name.lower().strip()
-    for canonical in SERVICES_DB.keys():
-        if s_lower == canonical.lower(): return canonical
-    for canonical, details in SERVICES_DB.items():
-        if "aliases" in details:
-            for alias in details["aliases"]:
-                if alias in s_lower: return canonical
-    return None
+    return SERVICE_MATCHER.match(service_name)
 
 # --- CALENDAR INTEGRATION ---
-def get_available_slots_for_days(days=3):
+async def _fetch_slots(start_time, end_time):
+    params = {"apiKey": CAL_API_KEY, "eventTypeId": CAL_EVENT_TYPE_ID, "startTime": start_time, "endTime": end_time}
+    resp = await http_client.get(f"{CAL_BASE_URL}/slots", params=params, timeout=10)
+    resp.raise_for_status()
+    data = resp.json()
+    raw_slots = data.get("slots", {})
+    formatted_slots = []
+    for date_key, day_slots in raw_slots.items():
+        for s in day_slots:
+            slot_iso = s.get("time")
+            if slot_iso:
+                dt_obj = datetime.fromisoformat(slot_iso.replace("Z", "+00:00"))
+                formatted_slots.append({"datetime": dt_obj.strftime("%Y-%m-%d %H:%M"), "iso": slot_iso})
+    return formatted_slots[:15]
+
+async def get_available_slots_for_days(days=3):
     if not CAL_API_KEY or not CAL_EVENT_TYPE_ID: return []
     now = datetime.now()
     start_time = (now + timedelta(days=1)).replace(hour=8, minute=0, second=0).strftime("%Y-%m-%dT%H:%M:%S.000Z")
-    end_time = (now + timedelta(days=days+1)).strftime("%Y-%m-%dT%H:%M:%S.000Z")
-    params = {"apiKey": CAL_API_KEY, "eventTypeId": CAL_EVENT_TYPE_ID, "startTime": start_time, "endTime": end_time}
+    # Window end is rounded to the hour so the slot cache key stays stable between calls.
+    end_time = (now + timedelta(days=days+1)).replace(minute=0, second=0).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+    key = (str(CAL_EVENT_TYPE_ID), start_time, end_time)
     try:
-        resp = requests.get(f"{CAL_BASE_URL}/slots", params=params, timeout=10)
-        resp.raise_for_status()
-        data = resp.json()
-        raw_slots = data.get("slots", {})
-        formatted_slots = []
-        for date_key, day_slots in raw_slots.items():
-            for s in day_slots:
-                slot_iso = s.get("time")
-                if slot_iso:
-                    dt_obj = datetime.fromisoformat(slot_iso.replace("Z", "+00:00"))
-                    formatted_slots.append({"datetime": dt_obj.strftime("%Y-%m-%d %H:%M"), "iso": slot_iso})
-        return formatted_slots[:15]
+        return await slot_cache.get_or_fetch(key, lambda: _fetch_slots(start_time, end_time))
     except Exception as e:
-        print(f"❌ Error fetching slots: {e}")
+        log.error("slots_fetch_failed", error=e)
         return []
 
-def create_booking_cal(name, phone, email, datetime_iso, notes=None):
+async def create_booking_cal(name, phone, email, datetime_iso, notes=None):
     if not CAL_API_KEY or not CAL_EVENT_TYPE_ID: return {"status": "error", "message": "Missing Config"}
     payload = {
         "eventTypeId": int(CAL_EVENT_TYPE_ID),
@@ -130,39 +155,87 @@ def create_booking_cal(name, phone, email, datetime_iso, notes=None):
         "metadata": {"source": "retell_ai", "notes": notes}
     }
     try:
-        resp = requests.post(f"{CAL_BASE_URL}/bookings", params={"apiKey": CAL_API_KEY}, json=payload, timeout=10)
-        if resp.status_code in [200, 201]: return {"status": "success", "data": resp.json()}
+        resp = await http_client.post(f"{CAL_BASE_URL}/bookings", params={"apiKey": CAL_API_KEY}, json=payload, timeout=10)
+        if resp.status_code in [200, 201]:
+            slot_cache.invalidate(CAL_EVENT_TYPE_ID)
+            return {"status": "success", "data": resp.json()}
         return {"status": "error", "message": resp.text}
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
+async def book_held_slot(holder, datetime_iso, **booking):
+    """Books only if no one else (another call, the website) holds the slot; drops our own hold."""
+    try:
+        slot_ts(datetime_iso)
+    except (AttributeError, TypeError, ValueError):
+        return {"status": "error", "message": "Neplatný čas termínu, použite formát RRRR-MM-DD HH:MM."}
+    if not slot_holds.consume(datetime_iso, holder):
+        return {"status": "error", "message": "Tento termín si práve rezervuje niekto iný, vyberte prosím iný čas."}
+    return await create_booking_cal(datetime_iso=datetime_iso, **booking)
+
 # --- PATIENT LOOKUP ---
-def get_patient_by_phone(phone_number: str):
-    if not SUPABASE_URL or not SUPABASE_KEY: return None
-    clean_phone = phone_number.replace(" ", "").replace("-", "")
+PATIENT_CACHE_PREWARM = os.getenv("PATIENT_CACHE_PREWARM", "false").lower() in ("1", "true", "yes")
+
+def _supabase_headers():
+    return {"apikey": SUPABASE_KEY, "Authorization": f"Bearer {SUPABASE_KEY}", "Content-Type": "application/json"}
+
+def _format_patient(p):
+    return {
+        "forename": p.get("forename") or p.get("first_name"),
+        "surname": p.get("surname") or p.get("last_name"),
+        "email": p.get("email"),
+        "last_visit_date": p.get("last_visit_date"),
+        "other_relevant_info": p.get("notes") or ""
+    }
+
+async def _fetch_patient(clean_phone):
     url = f"{SUPABASE_URL}/rest/v1/Patients"
-    headers = {"apikey": SUPABASE_KEY, "Authorization": f"Bearer {SUPABASE_KEY}", "Content-Type": "application/json"}
     params = {"phone": f"eq.{clean_phone}"}
-    try:
-        response = requests.get(url, headers=headers, params=params, timeout=2)
+    response = await http_client.get(url, headers=_supabase_headers(), params=params, timeout=2)
+    response.raise_for_status()
+    patients = response.json()
+    return _format_patient(patients[0]) if patients else None
+
+async def _fetch_all_patients(page_size=1000):
+    """Pages through the Patients table for the startup cache pre-warm."""
+    url = f"{SUPABASE_URL}/rest/v1/Patients"
+    records, offset = [], 0
+    while True:
+        params = {"select": "*", "limit": page_size, "offset": offset}
+        response = await http_client.get(url, headers=_supabase_headers(), params=params, timeout=10, adaptive=False)
         response.raise_for_status()
-        patients = response.json()
-        if patients:
-            p = patients[0]
-            return {
-                "forename": p.get("forename") or p.get("first_name"),
-                "surname": p.get("surname") or p.get("last_name"),
-                "email": p.get("email"),
-                "last_visit_date": p.get("last_visit_date"),
-                "other_relevant_info": p.get("notes") or ""
-            }
-        return None
+        page = response.json()
+        records.extend((p.get("phone"), _format_patient(p)) for p in page)
+        if len(page) < page_size:
+            return records
+        offset += page_size
+
+async def get_patient_by_phone(phone_number: str):
+    if not SUPABASE_URL or not SUPABASE_KEY: return None
+    clean_phone = normalize_phone(phone_number)
+    if not clean_phone: return None
+    try:
+        return await patient_cache.get_or_fetch(clean_phone, lambda: _fetch_patient(clean_phone))
     except Exception as e:
-        print(f"❌ Supabase error: {e}")
+        log.error("patient_lookup_failed", error=e)
         return None
 
 # --- FASTAPI APP ---
 app = FastAPI(title="Retell AI Receptionist Backend")
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(LogContextMiddleware)
+
+@app.on_event("startup")
+async def startup():
+    slot_cache.start()
+    if PATIENT_CACHE_PREWARM and SUPABASE_URL and SUPABASE_KEY:
+        asyncio.get_running_loop().create_task(patient_cache.prewarm(_fetch_all_patients))
+
+@app.on_event("shutdown")
+async def shutdown():
+    await slot_cache.stop()
+    await http_client.close_clients()
+    log.stop()
 
 MOCK_PATIENTS = {
     "+421919165630": {
@@ -177,15 +250,21 @@ MOCK_PATIENTS = {
 @app.get("/")
 async def root(): return {"status": "online"}
 
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus text format: per-route and per-upstream latency histograms, in-flight counts, errors."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.post("/firstWebhook")
 async def first_webhook(request: Request):
-    print("🔔 firstWebhook CALLED")
     data = await request.json()
     call_data = data.get("call", {})
     from_number = call_data.get("from_number") or "UNKNOWN"
-    clean_number = str(from_number).replace(" ", "")
+    log.bind(call_id=call_data.get("call_id"))
+    log.info("first_webhook", from_number=from_number)
+    clean_number = normalize_phone(from_number) or "UNKNOWN"
     
-    patient = get_patient_by_phone(clean_number) or MOCK_PATIENTS.get(clean_number)
+    patient = await get_patient_by_phone(clean_number) or MOCK_PATIENTS.get(clean_number)
     
     if patient:
         name = f"{patient.get('forename', '')} {patient.get('surname', '')}"
@@ -206,8 +285,18 @@ async def get_appointment(request: Request):
     if not canonical and service != "General":
         return {"error": f"Služba '{service}' nie je v ponuke."}
     
-    slots = get_available_slots_for_days(days=4)
+    slots = await get_available_slots_for_days(days=4)
+    call_id = data.get("call", {}).get("call_id")
+    log.bind(call_id=call_id)
+    duration = SERVICES_DB.get(canonical, {}).get("duration_min", 30)
+    # Hide slots someone else is booking right now, then hold the first few we offer
+    free = set(slot_holds.free([s["iso"] for s in slots], call_id, duration))
+    slots = [s for s in slots if s["iso"] in free]
+    if call_id:
+        # Without a call id a hold could not be told apart from another call's, so nothing is held
+        slot_holds.hold_many([s["iso"] for s in slots[:SLOT_HOLD_OFFERED]], call_id, duration)
     for s in slots: s["service"] = canonical or "General"
+    log.info("slots_offered", service=canonical or service, count=len(slots))
     return {"available_slots": slots}
 
 @app.post("/Book_appointment")
@@ -224,7 +313,20 @@ async def book_appointment(request: Request):
         iso = dt.strftime("%Y-%m-%dT%H:%M:%S.000Z")
     except: iso = dt_str
         
-    result = create_booking_cal(name=args.get("patient_name"), phone=args.get("patient_phone"), email="", datetime_iso=iso, notes=f"Service: {canonical}")
+    phone = normalize_phone(args.get("patient_phone")) or args.get("patient_phone")
+    call_id = data.get("call", {}).get("call_id")
+    log.bind(call_id=call_id)
+    book = lambda: book_held_slot(call_id or f"anonymous-{uuid.uuid4().hex}", iso, name=args.get("patient_name"), phone=phone, email="", notes=f"Service: {canonical}")
+    if call_id or phone:
+        # Retell may retry the tool call; a repeat from the same call (time, phone, name) books only once
+        result = await booking_requests.arun(idempotency_key(iso, call_id, phone, args.get("patient_name")), book)
+    else:
+        # Nothing identifies the caller: deduplicating would hand one caller's result to another
+        result = await book()
+    if result.get("status") == "success":
+        log.info("booking_created", start=iso, service=canonical, repeated=result.get("repeated", False))
+    else:
+        log.warning("booking_failed", start=iso, message=result.get("message"), details=result.get("data"))
     return result
 
 if __name__ == "__main__":
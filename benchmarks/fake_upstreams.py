@@ -0,0 +1,313 @@
+"""
+Local stand-ins for the services the backends call, for load testing.
+
+One HTTP server answers the Cal.com (/v1/slots, /v1/bookings), Supabase REST
+(/rest/v1/...) and OpenAI (/v1/chat/completions, incl. streaming) endpoints the
+apps use. Optional SMTP and IMAP servers accept mail and APPENDs.
+Every service gets configurable latency and error injection:
+
+    python benchmarks/fake_upstreams.py --port 9100 \
+        --latency calcom=0.15-0.4 --latency openai=0.8 --errors supabase=0.02 \
+        --smtp-port 9125 --imap-port 9143 --tls-cert cert.pem --tls-key key.pem
+
+Latency is seconds, either fixed ("0.3") or a uniform range ("0.1-0.5"); errors
+are the fraction of calls answered with 503 (or a dropped connection for SMTP/IMAP).
+`--services calcom` serves only some of the HTTP fakes, so each can run on its
+own port (the apps keep one circuit breaker per host:port).
+"""
+import re
+import ssl
+import sys
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+import datetime
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+SERVICES = ("calcom", "supabase", "openai", "smtp", "imap")
+
+
+class Faults:
+    """Latency + error injection per service."""
+
+    def __init__(self, latency=None, errors=None):
+        self.latency = latency or {}
+        self.errors = errors or {}
+
+    def delay(self, service):
+        low, high = self.latency.get(service, (0.0, 0.0))
+        return random.uniform(low, high)
+
+    def fails(self, service):
+        return random.random() < self.errors.get(service, 0.0)
+
+    async def apply(self, service):
+        """Sleeps the injected latency; returns True if this call should fail."""
+        wait = self.delay(service)
+        if wait:
+            await asyncio.sleep(wait)
+        return self.fails(service)
+
+
+def _iso(dt):
+    return dt.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+def create_app(faults, services=SERVICES):
+    app = FastAPI(title="Fake upstreams")
+    bookings = {}   # uid -> Cal.com booking dict
+    tables = {}     # Supabase table -> rows
+
+    def unavailable():
+        return JSONResponse({"message": "injected failure"}, status_code=503)
+
+    # --- Cal.com ---
+    if "calcom" in services:
+        @app.get("/v1/slots")
+        async def slots(startTime: str, endTime: str):
+            if await faults.apply("calcom"):
+                return unavailable()
+            start = datetime.datetime.fromisoformat(startTime.replace("Z", "+00:00"))
+            end = datetime.datetime.fromisoformat(endTime.replace("Z", "+00:00"))
+            taken = {b["startTime"] for b in bookings.values()}
+            days = {}
+            t = start.replace(minute=0, second=0, microsecond=0)
+            while t < end:
+                if t.weekday() < 5 and 8 <= t.hour < 18 and _iso(t) not in taken:
+                    days.setdefault(t.date().isoformat(), []).append({"time": _iso(t)})
+                t += datetime.timedelta(minutes=30)
+            return {"slots": days}
+
+        @app.get("/v1/bookings")
+        async def list_bookings(take: int = 100, page: int = 1):
+            if await faults.apply("calcom"):
+                return unavailable()
+            items = sorted(bookings.values(), key=lambda b: b["startTime"])
+            return {"bookings": items[(page - 1) * take:page * take]}
+
+        @app.post("/v1/bookings")
+        async def create_booking(request: Request):
+            if await faults.apply("calcom"):
+                return unavailable()
+            body = await request.json()
+            start = datetime.datetime.fromisoformat(str(body.get("start")).replace("Z", "+00:00"))
+            start_iso = _iso(start.astimezone(datetime.timezone.utc))
+            if any(b["startTime"] == start_iso for b in bookings.values()):
+                return JSONResponse({"message": "no_available_users_found_error"}, status_code=409)
+            responses = body.get("responses") or {}
+            uid = uuid.uuid4().hex
+            bookings[uid] = {
+                "uid": uid,
+                "status": "ACCEPTED",
+                "startTime": start_iso,
+                "endTime": _iso(start.astimezone(datetime.timezone.utc) + datetime.timedelta(minutes=30)),
+                "attendees": [{"email": responses.get("email"), "name": responses.get("name")}],
+            }
+            return bookings[uid]
+
+        @app.delete("/v1/bookings/{uid}/cancel")
+        async def cancel_booking(uid: str):
+            if await faults.apply("calcom"):
+                return unavailable()
+            bookings.pop(uid, None)
+            return {"message": "ok"}
+
+    # --- Supabase REST (PostgREST) ---
+    if "supabase" in services:
+        @app.get("/rest/v1/{table}")
+        async def select_rows(table: str, request: Request):
+            if await faults.apply("supabase"):
+                return unavailable()
+            rows = tables.get(table, [])
+            for column, expr in request.query_params.items():
+                if expr.startswith("eq."):
+                    rows = [r for r in rows if str(r.get(column)) == expr[3:]]
+            offset = int(request.query_params.get("offset", 0))
+            limit = int(request.query_params.get("limit", len(rows) or 1))
+            return rows[offset:offset + limit]
+
+        @app.post("/rest/v1/{table}")
+        async def upsert_rows(table: str, request: Request):
+            if await faults.apply("supabase"):
+                return unavailable()
+            body = await request.json()
+            rows = body if isinstance(body, list) else [body]
+            tables.setdefault(table, []).extend(rows)
+            return JSONResponse(rows, status_code=201)
+
+    # --- OpenAI chat completions ---
+    if "openai" in services:
+        @app.post("/v1/chat/completions")
+        async def chat_completions(request: Request):
+            body = await request.json()
+            if await faults.apply("openai"):
+                return JSONResponse({"error": {"message": "injected failure"}}, status_code=503)
+            content = json.dumps({
+                "intention": "question",
+                "response": "Dobrý deň, rád vám pomôžem. Čo by ste potrebovali?",
+                "forname": "null", "surname": "null", "email": "null", "phone": "null"
+            }, ensure_ascii=False)
+            created = int(time.time())
+            if not body.get("stream"):
+                return {
+                    "id": f"chatcmpl-{uuid.uuid4().hex}", "object": "chat.completion", "created": created,
+                    "model": body.get("model", "gpt-4o-mini"),
+                    "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+                    "usage": {"prompt_tokens": 500, "completion_tokens": 60, "total_tokens": 560},
+                }
+
+            async def chunks():
+                cid = f"chatcmpl-{uuid.uuid4().hex}"
+                for i in range(0, len(content), 12):
+                    chunk = {
+                        "id": cid, "object": "chat.completion.chunk", "created": created, "model": body.get("model", "gpt-4o-mini"),
+                        "choices": [{"index": 0, "delta": {"content": content[i:i + 12]}, "finish_reason": None}],
+                    }
+                    yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+                    await asyncio.sleep(0.01)
+                yield "data: [DONE]\n\n"
+
+            return StreamingResponse(chunks(), media_type="text/event-stream")
+
+    @app.get("/_fake/state")
+    async def state():
+        return {"bookings": len(bookings), "tables": {k: len(v) for k, v in tables.items()}}
+
+    return app
+
+
+# --- SMTP / IMAP (just enough protocol for smtplib and imaplib) ---
+async def _smtp_session(reader, writer, faults, counters):
+    async def reply(line):
+        writer.write(line.encode() + b"\r\n")
+        await writer.drain()
+
+    try:
+        await reply("220 fake-smtp ready")
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            command = line.decode(errors="replace").strip().upper()
+            if await faults.apply("smtp"):
+                break  # dropped connection
+            if command.startswith(("EHLO", "HELO")):
+                writer.write(b"250-fake-smtp\r\n250-AUTH PLAIN LOGIN\r\n250 8BITMIME\r\n")
+                await writer.drain()
+            elif command.startswith("AUTH"):
+                await reply("235 2.7.0 Authentication successful")
+            elif command.startswith("DATA"):
+                await reply("354 End data with <CR><LF>.<CR><LF>")
+                while (await reader.readline()) not in (b".\r\n", b".\n", b""):
+                    pass
+                counters["smtp"] += 1
+                await reply("250 2.0.0 queued")
+            elif command.startswith("QUIT"):
+                await reply("221 bye")
+                break
+            else:
+                await reply("250 OK")
+    finally:
+        writer.close()
+
+
+async def _imap_session(reader, writer, faults, counters):
+    async def send(line):
+        writer.write(line.encode() + b"\r\n")
+        await writer.drain()
+
+    try:
+        await send("* OK [CAPABILITY IMAP4rev1 AUTH=PLAIN] fake-imap ready")
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            tag, _, rest = line.decode(errors="replace").strip().partition(" ")
+            command = rest.split(" ", 1)[0].upper()
+            if await faults.apply("imap"):
+                break
+            if command == "CAPABILITY":
+                await send("* CAPABILITY IMAP4rev1 AUTH=PLAIN")
+                await send(f"{tag} OK CAPABILITY completed")
+            elif command == "APPEND":
+                size = re.search(r"\{(\d+)\}$", rest)
+                if size:
+                    await send("+ Ready for literal data")
+                    await reader.readexactly(int(size.group(1)))
+                    await reader.readline()
+                counters["imap"] += 1
+                await send(f"{tag} OK APPEND completed")
+            elif command == "LOGOUT":
+                await send("* BYE fake-imap")
+                await send(f"{tag} OK LOGOUT completed")
+                break
+            else:
+                await send(f"{tag} OK {command} completed")
+    except asyncio.IncompleteReadError:
+        pass
+    finally:
+        writer.close()
+
+
+def _parse_specs(values, kind):
+    parsed = {}
+    for value in values or []:
+        service, _, spec = value.partition("=")
+        if service not in SERVICES or not spec:
+            sys.exit(f"--{kind} expects service=value with service in {', '.join(SERVICES)}")
+        if kind == "latency":
+            low, _, high = spec.partition("-")
+            parsed[service] = (float(low), float(high or low))
+        else:
+            parsed[service] = float(spec)
+    return parsed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100, help="HTTP port (Cal.com, Supabase, OpenAI)")
+    parser.add_argument("--services", default="calcom,supabase,openai", help="HTTP fakes to serve on this port")
+    parser.add_argument("--smtp-port", type=int, help="also run a fake SMTP server")
+    parser.add_argument("--imap-port", type=int, help="also run a fake IMAP server")
+    parser.add_argument("--tls-cert", help="certificate for SMTP/IMAP (the apps connect with SMTP_SSL / IMAP4_SSL)")
+    parser.add_argument("--tls-key")
+    parser.add_argument("--latency", action="append", help="service=seconds or service=min-max (repeatable)")
+    parser.add_argument("--errors", action="append", help="service=fraction (repeatable)")
+    args = parser.parse_args()
+
+    faults = Faults(_parse_specs(args.latency, "latency"), _parse_specs(args.errors, "errors"))
+    counters = {"smtp": 0, "imap": 0}
+
+    tls = None
+    if args.tls_cert:
+        tls = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        tls.load_cert_chain(args.tls_cert, args.tls_key)
+
+    servers = []
+    if args.smtp_port:
+        servers.append(await asyncio.start_server(lambda r, w: _smtp_session(r, w, faults, counters), args.host, args.smtp_port, ssl=tls))
+        print(f"Fake SMTP on {args.host}:{args.smtp_port}{' (TLS)' if tls else ''}")
+    if args.imap_port:
+        servers.append(await asyncio.start_server(lambda r, w: _imap_session(r, w, faults, counters), args.host, args.imap_port, ssl=tls))
+        print(f"Fake IMAP on {args.host}:{args.imap_port}{' (TLS)' if tls else ''}")
+
+    app = create_app(faults, services=tuple(s.strip() for s in args.services.split(",")))
+    config = uvicorn.Config(app, host=args.host, port=args.port, log_level="warning")
+    print(f"Fake HTTP upstreams ({args.services}) on http://{args.host}:{args.port}")
+    try:
+        await uvicorn.Server(config).serve()
+    finally:
+        for server in servers:
+            server.close()
+        print(f"Mail received: {counters}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,160 @@
+"""
+Load generator for the voice agent and the website backend.
+
+    # Retell call flows: /firstWebhook -> /Get_Appointment -> /Book_appointment
+    python benchmarks/load_test.py voice --base-url http://127.0.0.1:8002 --concurrency 20 --duration 60
+
+    # Website chat sessions: several /webhook/chat turns per conversation
+    python benchmarks/load_test.py chat --base-url http://127.0.0.1:8001 --concurrency 20 --duration 60 --turns 4
+
+Prints throughput, errors and p50/p95/p99 latency per route. `--json out.json`
+saves the report and `--compare before.json` prints the change against an
+earlier run.
+"""
+import sys
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+
+import httpx
+
+SERVICES = ["Preventívna prehliadka", "Dentálne čistenie", "plomba", "bielenie", "bolesť zuba"]
+CHAT_MESSAGES = [
+    "Ahoj, čo presne robíte?",
+    "Koľko stojí automatizácia pre malú firmu?",
+    "Chcem demo, kedy sa môžeme stretnúť?",
+    "Do you integrate with our CRM?",
+    "Ďakujem, ozvem sa.",
+]
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}   # route -> [seconds]
+        self.errors = {}    # route -> count
+        self.started = time.perf_counter()
+
+    async def call(self, client, route, payload):
+        start = time.perf_counter()
+        try:
+            response = await client.post(route, json=payload)
+            ok = response.status_code < 400
+            body = response.json() if ok else None
+            if isinstance(body, dict) and (body.get("status") == "error" or "error" in body):
+                ok = False
+        except Exception:
+            ok, body = False, None
+        self.samples.setdefault(route, []).append(time.perf_counter() - start)
+        if not ok:
+            self.errors[route] = self.errors.get(route, 0) + 1
+        return body
+
+    def report(self):
+        elapsed = time.perf_counter() - self.started
+        routes = {}
+        for route, values in sorted(self.samples.items()):
+            ordered = sorted(values)
+
+            def pct(p):
+                return ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000
+
+            routes[route] = {
+                "requests": len(values),
+                "errors": self.errors.get(route, 0),
+                "rps": round(len(values) / elapsed, 2),
+                "p50_ms": round(pct(0.50), 1),
+                "p95_ms": round(pct(0.95), 1),
+                "p99_ms": round(pct(0.99), 1),
+                "max_ms": round(ordered[-1] * 1000, 1),
+            }
+        return {"elapsed_s": round(elapsed, 1), "routes": routes}
+
+
+async def voice_flow(client, recorder):
+    """One Retell call: greeting lookup, slot offer, booking one of the offered slots."""
+    call = {"call_id": f"bench-{uuid.uuid4().hex[:12]}", "from_number": f"+4219{random.randint(10000000, 99999999)}"}
+    service = random.choice(SERVICES)
+    await recorder.call(client, "/firstWebhook", {"call": call})
+    offered = await recorder.call(client, "/Get_Appointment", {"call": call, "args": {"service": service}})
+    slots = (offered or {}).get("available_slots") or []
+    if not slots:
+        return
+    slot = random.choice(slots[:3])
+    await recorder.call(client, "/Book_appointment", {"call": call, "args": {
+        "patient_name": "Load Test", "patient_phone": call["from_number"], "datetime": slot["datetime"], "service": service
+    }})
+
+
+async def chat_flow(client, recorder, turns):
+    """One website conversation: `turns` messages with the server keeping the history."""
+    conversation_id = f"bench-{uuid.uuid4().hex[:12]}"
+    for message in random.sample(CHAT_MESSAGES, min(turns, len(CHAT_MESSAGES))):
+        await recorder.call(client, "/webhook/chat", {"message": message, "conversationID": conversation_id, "lang": "sk"})
+
+
+async def run(args):
+    recorder = Recorder()
+    deadline = time.perf_counter() + args.duration
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=args.timeout) as client:
+        async def user():
+            while time.perf_counter() < deadline:
+                if args.scenario == "voice":
+                    await voice_flow(client, recorder)
+                else:
+                    await chat_flow(client, recorder, args.turns)
+                if args.think_time:
+                    await asyncio.sleep(random.uniform(0, args.think_time))
+
+        await asyncio.gather(*(user() for _ in range(args.concurrency)))
+    return recorder.report()
+
+
+def print_report(report, baseline=None):
+    print(f"\nElapsed {report['elapsed_s']} s")
+    header = f"{'route':<28}{'reqs':>8}{'errors':>8}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}"
+    print(header)
+    print("-" * len(header))
+    for route, r in report["routes"].items():
+        print(f"{route:<28}{r['requests']:>8}{r['errors']:>8}{r['rps']:>10}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}{r['max_ms']:>10}")
+        before = (baseline or {}).get("routes", {}).get(route)
+        if before:
+            deltas = "".join(
+                f"{(r[k] - before[k]) / before[k] * 100 if before[k] else 0:>+9.0f}%" for k in ("rps", "p50_ms", "p95_ms", "p99_ms", "max_ms")
+            )
+            print(f"{'  vs baseline':<44}{deltas}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("scenario", choices=["voice", "chat"])
+    parser.add_argument("--base-url", required=True)
+    parser.add_argument("--concurrency", type=int, default=10, help="simultaneous calls / chat users")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds")
+    parser.add_argument("--turns", type=int, default=3, help="messages per chat conversation")
+    parser.add_argument("--think-time", type=float, default=0.0, help="max random pause between flows (s)")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--compare", help="earlier --json report to compare against")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    report["scenario"], report["concurrency"] = args.scenario, args.concurrency
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    if not report["routes"]:
+        sys.exit("No requests completed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from zoneinfo import ZoneInfo
+
+Interval = Tuple[float, float]  # (start, end) as UNIX timestamps
+
+DEFAULT_TIMEZONE = "Europe/Bratislava"
+# weekday (0 = Monday) -> opening periods as ("HH:MM", "HH:MM")
+DEFAULT_BUSINESS_HOURS: Dict[int, List[Tuple[str, str]]] = {d: [("08:00", "18:00")] for d in range(5)}
+
+
+def parse_business_hours(spec: Optional[str]) -> Dict[int, List[Tuple[str, str]]]:
+    """
+    Parses "0-4 08:00-12:00,13:00-18:00; 5 09:00-12:00" into the business hours dict.
+    Returns the defaults for an empty spec.
+    """
+    if not spec:
+        return DEFAULT_BUSINESS_HOURS
+    hours: Dict[int, List[Tuple[str, str]]] = {}
+    for part in spec.split(";"):
+        days, _, periods = part.strip().partition(" ")
+        first, _, last = days.partition("-")
+        for day in range(int(first), int(last or first) + 1):
+            hours[day] = [tuple(p.strip().split("-", 1)) for p in periods.split(",") if p.strip()]
+    return hours
+
+
+def merge_intervals(intervals: Iterable[Interval]) -> List[Interval]:
+    """Sorts and merges overlapping/touching busy intervals."""
+    merged: List[List[float]] = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [(s, e) for s, e in merged]
+
+
+def _open_periods(start: datetime.datetime, end: datetime.datetime, hours, tz) -> List[Interval]:
+    periods = []
+    day = start.astimezone(tz).date()
+    last_day = end.astimezone(tz).date()
+    while day <= last_day:
+        for opens, closes in hours.get(day.weekday(), []):
+            o = datetime.datetime.combine(day, datetime.time.fromisoformat(opens), tz).timestamp()
+            c = datetime.datetime.combine(day, datetime.time.fromisoformat(closes), tz).timestamp()
+            o, c = max(o, start.timestamp()), min(c, end.timestamp())
+            if o < c:
+                periods.append((o, c))
+        day += datetime.timedelta(days=1)
+    return periods
+
+
+def free_ranges(
+    busy: Sequence[Interval],
+    start: datetime.datetime,
+    end: datetime.datetime,
+    duration_min: int = 30,
+    hours: Optional[Dict[int, List[Tuple[str, str]]]] = None,
+    timezone: str = DEFAULT_TIMEZONE,
+    granularity_min: int = 15,
+) -> List[Tuple[datetime.datetime, datetime.datetime]]:
+    """
+    Free time ranges inside business hours between `start` and `end` that can hold
+    at least one `duration_min` appointment. Range starts are rounded up to
+    `granularity_min` so every start the client derives is bookable.
+
+    `busy` may come in any order (bookings plus slot holds); sorting and merging it
+    costs O(n log n), after which a single sweep over the open periods is O(n + days).
+    """
+    tz = ZoneInfo(timezone)
+    duration, step = duration_min * 60, granularity_min * 60
+    busy = merge_intervals(busy)
+    result = []
+    i = 0
+    for open_at, close_at in _open_periods(start, end, hours or DEFAULT_BUSINESS_HOURS, tz):
+        # Skip busy intervals that ended before this period
+        while i < len(busy) and busy[i][1] <= open_at:
+            i += 1
+        cursor, j = open_at, i
+        while cursor < close_at:
+            gap_end = min(busy[j][0], close_at) if j < len(busy) else close_at
+            if gap_end > cursor:
+                aligned = -(-cursor // step) * step
+                if gap_end - aligned >= duration:
+                    result.append((datetime.datetime.fromtimestamp(aligned, tz), datetime.datetime.fromtimestamp(gap_end, tz)))
+            if j >= len(busy) or busy[j][0] >= close_at:
+                break
+            cursor = max(cursor, busy[j][1])
+            j += 1
+    return result
@@ -0,0 +1,80 @@
+import asyncio
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from chatbot_tools.metrics import metrics, upstream_name
+from chatbot_tools.resilience import upstream
+
+# One pooled client per upstream host, so every host gets its own keep-alive
+# pool and connection cap instead of sharing (or re-opening) TLS sessions.
+DEFAULT_LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=30.0)
+DEFAULT_TIMEOUT = httpx.Timeout(10.0, connect=3.0)
+
+_clients: Dict[str, httpx.AsyncClient] = {}
+_lock = asyncio.Lock()
+
+
+def _host_key(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+async def get_client(url: str, limits: Optional[httpx.Limits] = None) -> httpx.AsyncClient:
+    """
+    Returns the shared AsyncClient for the host of `url`, creating it on first use.
+    """
+    key = _host_key(url)
+    client = _clients.get(key)
+    if client is not None and not client.is_closed:
+        return client
+    async with _lock:
+        client = _clients.get(key)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(base_url=key, limits=limits or DEFAULT_LIMITS, timeout=DEFAULT_TIMEOUT)
+            _clients[key] = client
+        return client
+
+
+async def request(method: str, url: str, timeout: Optional[float] = None, adaptive: Optional[bool] = None, **kwargs) -> httpx.Response:
+    """
+    Sends a request over the pooled client for the url's host.
+    `timeout` is the per-call budget; for reads the actual timeout adapts below it
+    to the observed latency of the same method + path. Writes (and calls passing
+    `adaptive=False`, e.g. bulk page reads) always get the whole budget.
+    Raises CircuitOpenError without sending anything while the host's circuit
+    breaker is open.
+    """
+    client = await get_client(url)
+    parts = urlsplit(url)
+    name, operation = upstream_name(parts.netloc), f"{method} {parts.path}"
+    if adaptive is None:
+        adaptive = method in ("GET", "HEAD")
+    with upstream(name).guard(budget=timeout, operation=operation, adaptive=adaptive) as call:
+        kwargs["timeout"] = httpx.Timeout(call.timeout, connect=min(DEFAULT_TIMEOUT.connect, call.timeout))
+        with metrics.timed(name, operation):
+            response = await client.request(method, url, **kwargs)
+        if response.status_code >= 500:
+            call.failed()
+            metrics.inc("upstream_errors_total", upstream=name, operation=operation)
+    return response
+
+
+async def get(url: str, **kwargs) -> httpx.Response:
+    return await request("GET", url, **kwargs)
+
+
+async def post(url: str, **kwargs) -> httpx.Response:
+    return await request("POST", url, **kwargs)
+
+
+async def close_clients():
+    """Closes every pooled client. Call from the app's shutdown hook."""
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        try:
+            await client.aclose()
+        except Exception as e:
+            print(f"HTTP client close error: {e}")
@@ -0,0 +1,113 @@
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+Result = Dict[str, Any]
+
+
+def idempotency_key(*parts: Any) -> str:
+    """Stable key for a booking request, e.g. idempotency_key(time, email, phone)."""
+    normalized = "\x1f".join(str(p or "").strip().lower() for p in parts)
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+class IdempotencyStore:
+    """
+    Remembers in-flight and completed side-effecting calls (bookings) per key, so
+    repeats (email scanners prefetching the confirm link, double clicks, Retell
+    retries) get the first call's result instead of a second Cal.com POST.
+
+    Successful results are kept for `ttl`; errors only for `error_ttl`, so a real
+    retry can go through shortly after a failure. A repeat arriving while the first
+    call is still running waits for it and shares its result.
+    Works from threads (`run`) and from the event loop (`arun`).
+    """
+
+    def __init__(self, ttl: float = 86400.0, error_ttl: float = 15.0, maxsize: int = 5000):
+        self.ttl = ttl
+        self.error_ttl = error_ttl
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._done: "OrderedDict[str, Tuple[float, Result]]" = OrderedDict()
+        self._inflight: Dict[str, threading.Event] = {}
+        self._inflight_async: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Result]:
+        with self._lock:
+            entry = self._done.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._done[key]
+                return None
+            return dict(entry[1])
+
+    def _store(self, key: str, result: Result):
+        ttl = self.ttl if result.get("status") == "success" else self.error_ttl
+        with self._lock:
+            self._done[key] = (time.monotonic() + ttl, dict(result))
+            self._done.move_to_end(key)
+            while len(self._done) > self.maxsize:
+                self._done.popitem(last=False)
+
+    def forget(self, key: str):
+        with self._lock:
+            self._done.pop(key, None)
+
+    def run(self, key: str, call: Callable[[], Result], wait_timeout: float = 30.0) -> Result:
+        """Blocking variant for sync code paths (runs `call` at most once per key)."""
+        while True:
+            cached = self.get(key)
+            if cached is not None:
+                self.hits += 1
+                return dict(cached, repeated=True)
+            with self._lock:
+                pending = self._inflight.get(key)
+                if pending is None:
+                    pending = self._inflight[key] = threading.Event()
+                    break
+            # Someone else is booking this right now; wait and re-check
+            if not pending.wait(wait_timeout):
+                return {"status": "error", "message": "Booking is still being processed"}
+        self.misses += 1
+        try:
+            result = call()
+            self._store(key, result)
+            return result
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            pending.set()
+
+    async def arun(self, key: str, call: Callable[[], Awaitable[Result]]) -> Result:
+        """Event-loop variant (single-flight per key within the loop)."""
+        cached = self.get(key)
+        if cached is not None:
+            self.hits += 1
+            return dict(cached, repeated=True)
+        pending = self._inflight_async.get(key)
+        if pending is not None:
+            self.hits += 1
+            return dict(await asyncio.shield(pending), repeated=True)
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight_async[key] = future
+        try:
+            result = await call()
+            self._store(key, result)
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            self._inflight_async.pop(key, None)
+
+
+booking_requests = IdempotencyStore()
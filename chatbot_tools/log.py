@@ -0,0 +1,171 @@
+import atexit
+import contextvars
+import datetime
+import json
+import os
+import queue
+import random
+import sys
+import threading
+import uuid
+from typing import Dict, Optional
+
+from chatbot_tools.metrics import metrics
+
+LEVELS = {"debug": 10, "info": 20, "warning": 30, "error": 40}
+
+# Correlation ids (request_id, call_id, conversation_id...) and the sampling decision of the current request
+_context: contextvars.ContextVar = contextvars.ContextVar("log_context", default=None)
+
+
+def parse_sampling(spec: Optional[str]) -> Dict[str, float]:
+    """"/firstWebhook=0.1,/webhook/chat=0.5" -> {path: rate}; routes not listed are always logged."""
+    rates = {}
+    for item in (spec or "").split(","):
+        path, _, rate = item.strip().partition("=")
+        if path and rate:
+            rates[path] = min(max(float(rate), 0.0), 1.0)
+    return rates
+
+
+class JsonLogger:
+    """
+    Structured JSON-lines logger that never blocks the request path.
+
+    `log.info("event", key=value)` only checks the level and enqueues a tuple; a
+    background thread adds the correlation ids, serializes and writes (one flush per
+    batch). Below-level calls return before touching their arguments, so pass objects
+    (payload=payload), not pre-formatted strings. Debug/info records of a request
+    that was not sampled (per-route rate) are skipped; warnings and errors always go out.
+    If the queue is full the record is dropped and counted, never waited on.
+    """
+
+    def __init__(self, level: str = "info", sampling: Optional[Dict[str, float]] = None, stream=None, maxsize: int = 10000):
+        self.level = LEVELS.get(level.lower(), LEVELS["info"])
+        self.sampling = sampling or {}
+        self.stream = stream
+        self._queue: queue.Queue = queue.Queue(maxsize)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    # --- request path ---
+    def enabled(self, level: str) -> bool:
+        return LEVELS[level] >= self.level
+
+    def sampled(self, path: str) -> bool:
+        rate = self.sampling.get(path)
+        return rate is None or random.random() < rate
+
+    def log(self, level: str, event: str, **fields):
+        severity = LEVELS[level]
+        if severity < self.level:
+            return
+        ctx = _context.get()
+        if ctx is not None and severity < LEVELS["warning"] and not ctx.get("sampled", True):
+            return
+        if self._thread is None:
+            self.start()
+        try:
+            self._queue.put_nowait((datetime.datetime.now(datetime.timezone.utc), level, event, ctx, fields))
+        except queue.Full:
+            metrics.inc("log_records_dropped_total")
+
+    def debug(self, event: str, **fields):
+        self.log("debug", event, **fields)
+
+    def info(self, event: str, **fields):
+        self.log("info", event, **fields)
+
+    def warning(self, event: str, **fields):
+        self.log("warning", event, **fields)
+
+    def error(self, event: str, **fields):
+        self.log("error", event, **fields)
+
+    @staticmethod
+    def bind(**ids):
+        """Adds correlation ids (call_id, conversation_id...) to every record logged later in this request."""
+        ctx = dict(_context.get() or {})
+        ctx.update((k, v) for k, v in ids.items() if v is not None)
+        _context.set(ctx)
+
+    # --- writer thread ---
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="json-log", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout: float = 2.0):
+        """Flushes what is queued (called at shutdown and exit)."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            try:
+                self._queue.put(None, timeout=timeout)
+            except queue.Full:
+                return
+            thread.join(timeout)
+
+    @staticmethod
+    def _format(item) -> str:
+        ts, level, event, ctx, fields = item
+        record = {"ts": ts.isoformat(timespec="milliseconds"), "level": level, "event": event}
+        if ctx:
+            record.update((k, v) for k, v in ctx.items() if k != "sampled")
+        record.update(fields)
+        try:
+            return json.dumps(record, ensure_ascii=False, default=str) + "\n"
+        except (TypeError, ValueError) as e:
+            return json.dumps({"ts": record["ts"], "level": level, "event": event, "log_error": str(e)}) + "\n"
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < 500:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            lines = "".join(self._format(item) for item in batch if item is not None)
+            try:
+                stream = self.stream or sys.stdout
+                stream.write(lines)
+                stream.flush()
+            except Exception:
+                pass
+            if None in batch:
+                return
+
+
+class LogContextMiddleware:
+    """
+    ASGI middleware giving each request a request_id (X-Request-ID if the caller sent
+    one, echoed back in the response) and its sampling decision for `log`.
+    """
+
+    def __init__(self, app, logger: "JsonLogger" = None):
+        self.app = app
+        self.logger = logger or log
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        headers = dict(scope.get("headers") or [])
+        request_id = headers.get(b"x-request-id", b"").decode("latin-1")[:64] or uuid.uuid4().hex[:16]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        token = _context.set({"request_id": request_id, "sampled": self.logger.sampled(scope.get("path", ""))})
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _context.reset(token)
+
+
+log = JsonLogger(level=os.getenv("LOG_LEVEL", "info"), sampling=parse_sampling(os.getenv("LOG_SAMPLING")))
+atexit.register(log.stop)
+metrics.describe("log_records_dropped_total", "counter", "Log records dropped because the log queue was full")
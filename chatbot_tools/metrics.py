@@ -0,0 +1,195 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Dict, Iterable, List, Tuple
+
+# Seconds; covers fast local hits up to the slowest upstream timeouts
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+# Well-known upstream hosts -> short label
+UPSTREAM_HOSTS = {"api.cal.com": "calcom", "api.openai.com": "openai"}
+
+
+def upstream_name(host: str) -> str:
+    """Short label for a host (or host:port, so local stand-ins on different ports stay apart)."""
+    if host.endswith(".supabase.co"):
+        return "supabase"
+    return UPSTREAM_HOSTS.get(host, host)
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "total", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        i = bisect.bisect_left(self.buckets, value)
+        if i < len(self.counts):
+            self.counts[i] += 1
+        self.total += value
+        self.count += 1
+
+
+class Metrics:
+    """
+    Minimal in-process metrics registry (histograms, counters, gauges) rendered in
+    the Prometheus text format, so the apps need no client library.
+
+    Request latency comes from `MetricsMiddleware`; upstream calls are wrapped in
+    `timed(upstream, operation)`, which records latency, in-flight count and errors.
+    """
+
+    def __init__(self, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._gauges: Dict[str, Dict[Labels, float]] = {}
+        self._help: Dict[str, Tuple[str, str]] = {}
+
+    def describe(self, name: str, kind: str, text: str):
+        self._help[name] = (kind, text)
+
+    @staticmethod
+    def _labels(labels) -> Labels:
+        return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def observe(self, name: str, value: float, **labels):
+        key = self._labels(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            hist = series.get(key)
+            if hist is None:
+                hist = series[key] = Histogram(self.buckets)
+            hist.observe(value)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = self._labels(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def gauge_add(self, name: str, delta: float, **labels):
+        key = self._labels(labels)
+        with self._lock:
+            series = self._gauges.setdefault(name, {})
+            series[key] = series.get(key, 0) + delta
+
+    def gauge_set(self, name: str, value: float, **labels):
+        key = self._labels(labels)
+        with self._lock:
+            self._gauges.setdefault(name, {})[key] = value
+
+    @contextmanager
+    def timed(self, upstream: str, operation: str = "call"):
+        """Times one upstream call (works around sync code and awaits alike)."""
+        self.gauge_add("upstream_requests_in_flight", 1, upstream=upstream)
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.inc("upstream_errors_total", upstream=upstream, operation=operation)
+            raise
+        finally:
+            self.observe("upstream_request_duration_seconds", time.perf_counter() - start, upstream=upstream, operation=operation)
+            self.gauge_add("upstream_requests_in_flight", -1, upstream=upstream)
+
+    def instrument(self, obj, upstream: str, methods: Iterable[str]):
+        """Wraps blocking methods of a client object (e.g. SMTP.send_message) with `timed`."""
+        for name in methods:
+            original = getattr(obj, name)
+
+            @wraps(original)
+            def wrapper(*args, _original=original, _name=name, **kwargs):
+                with self.timed(upstream, _name):
+                    return _original(*args, **kwargs)
+
+            setattr(obj, name, wrapper)
+        return obj
+
+    # --- exposition ---
+    @staticmethod
+    def _fmt(labels: Labels, extra: Labels = ()) -> str:
+        pairs = labels + extra
+        if not pairs:
+            return ""
+        escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+        return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+    def _header(self, lines: List[str], name: str, kind: str):
+        help_kind, text = self._help.get(name, (kind, ""))
+        if text:
+            lines.append(f"# HELP {name} {text}")
+        lines.append(f"# TYPE {name} {help_kind}")
+
+    def render(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            for name, series in sorted(self._histograms.items()):
+                self._header(lines, name, "histogram")
+                for labels, hist in sorted(series.items()):
+                    cumulative = 0
+                    for bound, count in zip(hist.buckets, hist.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{self._fmt(labels, (('le', repr(bound)),))} {cumulative}")
+                    lines.append(f"{name}_bucket{self._fmt(labels, (('le', '+Inf'),))} {hist.count}")
+                    lines.append(f"{name}_sum{self._fmt(labels)} {hist.total:.6f}")
+                    lines.append(f"{name}_count{self._fmt(labels)} {hist.count}")
+            for kind, store in (("counter", self._counters), ("gauge", self._gauges)):
+                for name, series in sorted(store.items()):
+                    self._header(lines, name, kind)
+                    for labels, value in sorted(series.items()):
+                        lines.append(f"{name}{self._fmt(labels)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording per-route latency (by route template, so path
+    parameters don't explode the label set), status codes and in-flight requests.
+    Streaming responses are timed until the last chunk is sent.
+    """
+
+    def __init__(self, app, registry: "Metrics" = None):
+        self.app = app
+        self.metrics = registry or metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        self.metrics.gauge_add("http_requests_in_flight", 1)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", None) or getattr(scope.get("endpoint"), "__name__", None) or "unmatched"
+            self.metrics.observe(
+                "http_request_duration_seconds", time.perf_counter() - start,
+                route=path, method=scope.get("method", ""), status=status["code"]
+            )
+            self.metrics.gauge_add("http_requests_in_flight", -1)
+
+
+metrics = Metrics()
+metrics.describe("http_request_duration_seconds", "histogram", "Request latency by route, method and status")
+metrics.describe("http_requests_in_flight", "gauge", "Requests currently being handled")
+metrics.describe("upstream_request_duration_seconds", "histogram", "Latency of calls to Cal.com, Supabase, OpenAI, SMTP and IMAP")
+metrics.describe("upstream_requests_in_flight", "gauge", "Upstream calls currently in progress")
+metrics.describe("upstream_errors_total", "counter", "Upstream calls that raised or got a server error")
+metrics.describe("upstream_circuit_open", "gauge", "1 while the upstream's circuit breaker is open")
@@ -0,0 +1,125 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+from chatbot_tools.phone_utils import normalize_phone
+
+Patient = Dict[str, Any]
+
+# Returned by PatientCache.get() when the number has no (live) entry at all;
+# a cached None means "looked up recently, not a patient".
+MISSING = object()
+
+
+def phone_key(phone_number: str) -> str:
+    return normalize_phone(phone_number) or str(phone_number).strip()
+
+
+class PatientCache:
+    """
+    LRU cache of patient records keyed by E.164 phone number, with a TTL for hits and a
+    shorter TTL for numbers that are known not to be patients (negative caching).
+    Expired entries are kept for `stale_ttl` more and served when Supabase fails.
+    """
+
+    def __init__(self, maxsize: int = 5000, ttl: float = 600.0, negative_ttl: float = 120.0, stale_ttl: float = 86400.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.stale_ttl = stale_ttl
+        self._entries: "OrderedDict[str, Tuple[float, Optional[Patient]]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, phone_number: str):
+        key = phone_key(phone_number)
+        entry = self._entries.get(key)
+        if entry is None:
+            return MISSING
+        if entry[0] < time.monotonic():
+            if entry[0] + self.stale_ttl < time.monotonic():
+                self._entries.pop(key, None)
+            return MISSING
+        self._entries.move_to_end(key)
+        return dict(entry[1]) if entry[1] is not None else None
+
+    def get_stale(self, phone_number: str):
+        """Like get(), but also returns entries that expired less than `stale_ttl` ago."""
+        entry = self._entries.get(phone_key(phone_number))
+        if entry is None or entry[0] + self.stale_ttl < time.monotonic():
+            return MISSING
+        return dict(entry[1]) if entry[1] is not None else None
+
+    def set(self, phone_number: str, patient: Optional[Patient]):
+        key = phone_key(phone_number)
+        ttl = self.ttl if patient is not None else self.negative_ttl
+        self._entries[key] = (time.monotonic() + ttl, dict(patient) if patient is not None else None)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, phone_number: Optional[str] = None):
+        if phone_number is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(phone_key(phone_number), None)
+
+    async def get_or_fetch(self, phone_number: str, fetcher: Callable[[], Awaitable[Optional[Patient]]]) -> Optional[Patient]:
+        """
+        Returns the cached patient (or cached "unknown"), otherwise awaits `fetcher`.
+        Fetch errors are not cached, so an outage never marks callers as unknown; they
+        fall back to a stale entry when there is one, else propagate.
+        """
+        cached = self.get(phone_number)
+        if cached is not MISSING:
+            self.hits += 1
+            return cached
+        self.misses += 1
+
+        key = phone_key(phone_number)
+        try:
+            return await self._fetch(key, phone_number, fetcher)
+        except Exception:
+            stale = self.get_stale(phone_number)
+            if stale is MISSING:
+                raise
+            return stale
+
+    async def _fetch(self, key: str, phone_number: str, fetcher: Callable[[], Awaitable[Optional[Patient]]]) -> Optional[Patient]:
+        pending = self._inflight.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            patient = await fetcher()
+            self.set(phone_number, patient)
+            future.set_result(patient)
+            return patient
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    def load(self, records: Iterable[Tuple[str, Patient]]) -> int:
+        """Bulk-loads (phone, patient) pairs, e.g. from a Supabase export. Returns how many were stored."""
+        count = 0
+        for phone_number, patient in records:
+            if phone_number:
+                self.set(phone_number, patient)
+                count += 1
+        return count
+
+    async def prewarm(self, fetch_all: Callable[[], Awaitable[Iterable[Tuple[str, Patient]]]]):
+        try:
+            count = self.load(await fetch_all())
+            print(f"✅ Patient cache pre-warmed with {count} numbers")
+        except Exception as e:
+            print(f"⚠️ Patient cache pre-warm failed: {e}")
+
+
+patient_cache = PatientCache()
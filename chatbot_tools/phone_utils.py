@@ -0,0 +1,58 @@
+import re
+from typing import Optional
+from urllib.parse import unquote
+
+# Slovak clinic numbers by default; national numbers ("0919 165 630") get this prefix.
+DEFAULT_COUNTRY_CODE = "421"
+# Digits after the trunk "0" of a national number (Slovak numbers always have 9)
+NATIONAL_LENGTH = 9
+
+_PLACEHOLDERS = {"", "unknown", "null", "none", "{from_number}"}
+_FORMATTING_RE = re.compile(r"[\s\-\.\(\)/]+")
+_VALID_RE = re.compile(r"^\+?[0-9]+$")
+
+
+def normalize_phone(phone_number, default_country_code: str = DEFAULT_COUNTRY_CODE,
+                    national_length: int = NATIONAL_LENGTH) -> Optional[str]:
+    """
+    Normalizes a phone number to E.164 ("+421919165630") so every lookup, cache and
+    upsert uses the same key. Handles "00" and "0" (national) prefixes, URL-encoded
+    "%2B" and a "+" that was turned into a space by a query string.
+    Numbers that get the default country code must have `national_length` digits
+    (a country code typed after the "0", as in "0421 919 165 630", is dropped).
+    Returns None for placeholders ("UNKNOWN", "null", Retell's "{from_number}") and
+    anything that isn't a plausible number.
+    """
+    if phone_number is None:
+        return None
+    raw = str(phone_number)
+    if "%" in raw:
+        raw = unquote(raw)
+    if raw.strip().lower() in _PLACEHOLDERS:
+        return None
+
+    # A leading "+" decoded from a URL arrives as a space.
+    if raw[:1] == " " and raw.strip()[:1].isdigit():
+        raw = "+" + raw.strip()
+    number = _FORMATTING_RE.sub("", raw)
+    if not _VALID_RE.match(number):
+        return None
+
+    if number.startswith("+"):
+        digits = number[1:]
+    elif number.startswith("00"):
+        digits = number[2:]
+    elif number.startswith(default_country_code) and len(number) == len(default_country_code) + national_length:
+        digits = number
+    else:
+        national = number[1:] if number.startswith("0") else number
+        if national.startswith(default_country_code) and len(national) == len(default_country_code) + national_length:
+            national = national[len(default_country_code):]
+        if len(national) != national_length:
+            return None
+        digits = default_country_code + national
+
+    # E.164 allows at most 15 digits; anything under 8 is not a dialable number.
+    if not 8 <= len(digits) <= 15 or digits.startswith("0"):
+        return None
+    return "+" + digits
@@ -0,0 +1,145 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from chatbot_tools.metrics import metrics
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream that is known to be down."""
+
+
+class _Call:
+    __slots__ = ("timeout", "ok")
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self.ok = True
+
+    def failed(self):
+        """Marks the call as failed without raising (e.g. a 5xx response)."""
+        self.ok = False
+
+
+class Upstream:
+    """
+    Circuit breaker plus adaptive timeout for one upstream (Cal.com, Supabase, OpenAI).
+
+    After `failure_threshold` consecutive failures the circuit opens and calls fail
+    in microseconds with CircuitOpenError; after `reset_timeout` one probe call is let
+    through and its outcome closes or re-opens the circuit.
+
+    The timeout follows observed latency: `factor` x the p95 of recent successful
+    calls of the same operation (e.g. "GET /v1/slots"), kept between `min_timeout` and
+    the caller's budget, so a degraded upstream costs seconds less than the fixed
+    worst-case budget. Writes and bulk reads pass `adaptive=False` and always get the
+    full budget: a slow booking must not time out after Cal.com may have created it.
+    """
+
+    def __init__(self, name: str, max_timeout: float = 10.0, min_timeout: float = 1.0, failure_threshold: int = 5,
+                 reset_timeout: float = 30.0, window: int = 100, min_samples: int = 20, factor: float = 3.0):
+        self.name = name
+        self.max_timeout = max_timeout
+        self.min_timeout = min_timeout
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.window = window
+        self.min_samples = min_samples
+        self.factor = factor
+        self._latencies: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self._opened_at >= self.reset_timeout else "open"
+
+    def timeout(self, budget: Optional[float] = None, operation: str = "call", adaptive: bool = True) -> float:
+        ceiling = min(budget or self.max_timeout, self.max_timeout)
+        if not adaptive:
+            return ceiling
+        with self._lock:
+            samples = self._latencies.get(operation)
+            if samples is None or len(samples) < self.min_samples:
+                return ceiling
+            ordered = sorted(samples)
+        p95 = ordered[int(0.95 * (len(ordered) - 1))]
+        return min(max(p95 * self.factor, self.min_timeout), ceiling)
+
+    def before(self):
+        """Raises CircuitOpenError unless a call may go out now."""
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._probing:
+                raise CircuitOpenError(f"{self.name} unavailable (circuit open)")
+            self._probing = True
+
+    def success(self, elapsed: float, operation: str = "call"):
+        with self._lock:
+            samples = self._latencies.get(operation)
+            if samples is None:
+                samples = self._latencies[operation] = deque(maxlen=self.window)
+            samples.append(elapsed)
+            self._failures = 0
+            self._probing = False
+            if self._opened_at is not None:
+                self._opened_at = None
+                print(f"✅ {self.name} circuit closed")
+                metrics.gauge_set("upstream_circuit_open", 0, upstream=self.name)
+
+    def failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    print(f"⚠️ {self.name} circuit opened after {self._failures} failures")
+                self._opened_at = time.monotonic()
+                metrics.gauge_set("upstream_circuit_open", 1, upstream=self.name)
+
+    @contextmanager
+    def guard(self, budget: Optional[float] = None, operation: str = "call", adaptive: bool = True):
+        """
+        with calcom.guard(budget=10, operation="GET /v1/slots") as call:
+            response = requests.get(..., timeout=call.timeout)
+            if response.status_code >= 500: call.failed()
+
+        Raises CircuitOpenError before the block when the circuit is open.
+        """
+        self.before()
+        call = _Call(self.timeout(budget, operation, adaptive))
+        start = time.monotonic()
+        try:
+            yield call
+        except Exception:
+            self.failure()
+            raise
+        except BaseException:
+            # Cancelled (e.g. the client went away): says nothing about the upstream
+            with self._lock:
+                self._probing = False
+            raise
+        if call.ok:
+            self.success(time.monotonic() - start, operation)
+        else:
+            self.failure()
+
+
+_upstreams: Dict[str, Upstream] = {}
+_registry_lock = threading.Lock()
+
+
+def upstream(name: str, **options) -> Upstream:
+    """The shared Upstream for `name`, created with `options` on first use."""
+    with _registry_lock:
+        up = _upstreams.get(name)
+        if up is None:
+            up = _upstreams[name] = Upstream(name, **options)
+        return up
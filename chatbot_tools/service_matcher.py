@@ -0,0 +1,44 @@
+import re
+import unicodedata
+from typing import Any, Dict, Optional
+
+_SPACES_RE = re.compile(r"\s+")
+
+
+def fold(text: str) -> str:
+    """Lowercases, strips diacritics and collapses whitespace ("Dentálne  Čistenie" -> "dentalne cistenie")."""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return _SPACES_RE.sub(" ", stripped).strip()
+
+
+class ServiceMatcher:
+    """
+    Maps free-form service names from the voice agent onto SERVICES_DB keys.
+
+    Built once per services table: exact names resolve through a dict, everything
+    else through one compiled alternation of all names and aliases, so a lookup is a
+    single regex pass regardless of how many services there are.
+    """
+
+    def __init__(self, services: Dict[str, Dict[str, Any]]):
+        self._canonical: Dict[str, str] = {}
+        self._aliases: Dict[str, str] = {}
+        for canonical, details in services.items():
+            self._canonical[fold(canonical)] = canonical
+            self._aliases.setdefault(fold(canonical), canonical)
+            for alias in details.get("aliases", []):
+                self._aliases.setdefault(fold(alias), canonical)
+        # Longest first so "dentalna hygiena" wins over "hygiena" at the same position.
+        terms = sorted(self._aliases, key=len, reverse=True)
+        self._pattern = re.compile(r"(?<!\w)(?:" + "|".join(re.escape(t) for t in terms) + ")") if terms else None
+
+    def match(self, service_name: str) -> Optional[str]:
+        if not service_name:
+            return None
+        folded = fold(service_name)
+        canonical = self._canonical.get(folded)
+        if canonical or self._pattern is None:
+            return canonical
+        found = self._pattern.search(folded)
+        return self._aliases[found.group(0)] if found else None
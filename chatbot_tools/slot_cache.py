@@ -0,0 +1,117 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+SlotKey = Tuple[str, str, str]  # (event type id, window start, window end)
+Fetcher = Callable[[], Awaitable[List[Dict[str, Any]]]]
+
+
+class SlotCache:
+    """
+    In-process TTL cache for Cal.com availability, keyed by (event type, date window).
+
+    Keys that were read recently are re-fetched by a background task before they
+    expire, so the voice agent normally gets its slots without waiting on Cal.com.
+    If Cal.com fails, the last good slots (up to `stale_ttl` old) are served instead.
+    """
+
+    def __init__(self, ttl: float = 60.0, refresh_interval: float = 45.0, idle_after: float = 900.0, stale_ttl: float = 900.0):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.refresh_interval = refresh_interval
+        self.idle_after = idle_after
+        self._entries: Dict[SlotKey, Tuple[float, List[Dict[str, Any]]]] = {}
+        self._fetchers: Dict[SlotKey, Tuple[float, Fetcher]] = {}
+        self._inflight: Dict[SlotKey, asyncio.Future] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _copy(slots):
+        # Callers annotate the slot dicts (e.g. with the service), so never hand out the cached ones.
+        return [dict(s) for s in slots]
+
+    def get(self, key: SlotKey) -> Optional[List[Dict[str, Any]]]:
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry[0] > self.ttl:
+            return None
+        return self._copy(entry[1])
+
+    def set(self, key: SlotKey, slots: List[Dict[str, Any]]):
+        self._entries[key] = (time.monotonic(), self._copy(slots))
+
+    def invalidate(self, event_type_id: Optional[str] = None):
+        """Drops cached windows for one event type, or everything when no id is given."""
+        if event_type_id is None:
+            self._entries.clear()
+            return
+        for key in [k for k in self._entries if k[0] == str(event_type_id)]:
+            self._entries.pop(key, None)
+
+    async def _load(self, key: SlotKey, fetcher: Fetcher) -> List[Dict[str, Any]]:
+        # Single-flight: concurrent misses for the same window share one upstream call.
+        pending = self._inflight.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            slots = await fetcher()
+            self.set(key, slots)
+            future.set_result(slots)
+            return slots
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so an unawaited failure doesn't warn on garbage collection.
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    async def get_or_fetch(self, key: SlotKey, fetcher: Fetcher) -> List[Dict[str, Any]]:
+        """
+        Returns cached slots for `key`, fetching them on a miss. Fetch errors are not
+        cached; they fall back to stale slots when there are any, else propagate.
+        """
+        self._fetchers[key] = (time.monotonic(), fetcher)
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+        try:
+            return self._copy(await self._load(key, fetcher))
+        except Exception as e:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.stale_ttl:
+                raise
+            print(f"⚠️ Serving stale slots for {key}: {e}")
+            return self._copy(entry[1])
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            now = time.monotonic()
+            for key, (last_used, fetcher) in list(self._fetchers.items()):
+                if now - last_used > self.idle_after:
+                    self._fetchers.pop(key, None)
+                    self._entries.pop(key, None)
+                    continue
+                try:
+                    await self._load(key, fetcher)
+                except Exception as e:
+                    print(f"⚠️ Slot refresh failed for {key}: {e}")
+
+    def start(self):
+        """Starts the background refresher. Call from the app's startup hook."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+slot_cache = SlotCache()
@@ -0,0 +1,156 @@
+import datetime
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+Hold = Tuple[str, float, float]  # (holder, end_ts, expires_at)
+
+
+def slot_ts(iso: str) -> int:
+    """Slot start as a UTC timestamp; the hold key for both the website and the voice agent."""
+    dt = datetime.datetime.fromisoformat(iso.strip().replace("Z", "+00:00").replace(" ", "T"))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=datetime.timezone.utc)
+    return int(dt.timestamp())
+
+
+def ts_iso(ts: float) -> str:
+    """Cal.com-style UTC ISO string."""
+    return datetime.datetime.fromtimestamp(ts, datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+class SlotHolds:
+    """
+    Short-lived reservations on calendar slots, so the website and the voice agent
+    don't sell the same Cal.com slot twice.
+
+    A slot is held when it is offered (or picked), hidden from everyone else's
+    availability while the hold lives, and consumed right before the booking is
+    created. Expired holds simply stop counting.
+
+    In-process by default. With `db_path` the holds live in a SQLite file instead
+    (BEGIN IMMEDIATE takes the file lock), so separate apps on the same host share them.
+    """
+
+    def __init__(self, ttl: float = 300.0, db_path: Optional[str] = None):
+        self.ttl = ttl
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._holds: Dict[int, Hold] = {}
+        if db_path:
+            conn = self._db()
+            try:
+                conn.execute(
+                    "create table if not exists slot_holds "
+                    "(start_ts integer primary key, end_ts real not null, holder text not null, expires_at real not null)"
+                )
+            finally:
+                conn.close()
+
+    # --- storage ---
+    def _db(self):
+        return sqlite3.connect(self.db_path, timeout=5, isolation_level=None)
+
+    def _locked(self, fn):
+        """Runs fn(read, write, delete) atomically against the active backend."""
+        if not self.db_path:
+            with self._lock:
+                return fn(self._holds.get, self._holds.__setitem__, lambda k: self._holds.pop(k, None))
+        conn = self._db()
+        try:
+            conn.execute("begin immediate")
+
+            def read(key):
+                row = conn.execute("select holder, end_ts, expires_at from slot_holds where start_ts = ?", (key,)).fetchone()
+                return tuple(row) if row else None
+
+            def write(key, hold):
+                conn.execute("insert or replace into slot_holds values (?, ?, ?, ?)", (key, hold[1], hold[0], hold[2]))
+
+            def delete(key):
+                conn.execute("delete from slot_holds where start_ts = ?", (key,))
+
+            result = fn(read, write, delete)
+            conn.execute("commit")
+            return result
+        except Exception:
+            conn.execute("rollback")
+            raise
+        finally:
+            conn.close()
+
+    def _all(self) -> List[Tuple[int, Hold]]:
+        now = time.time()
+        if not self.db_path:
+            with self._lock:
+                for key in [k for k, h in self._holds.items() if h[2] <= now]:
+                    del self._holds[key]
+                return list(self._holds.items())
+        conn = self._db()
+        try:
+            conn.execute("delete from slot_holds where expires_at <= ?", (now,))
+            rows = conn.execute("select start_ts, holder, end_ts, expires_at from slot_holds").fetchall()
+        finally:
+            conn.close()
+        return [(start, (holder, end, expires)) for start, holder, end, expires in rows]
+
+    # --- holds ---
+    def hold(self, start: str, holder: str, duration_min: int = 30, ttl: Optional[float] = None) -> bool:
+        """Holds (or extends our hold on) a slot. False if someone else holds it."""
+        key = slot_ts(start)
+        expires = time.time() + (ttl or self.ttl)
+
+        def apply(read, write, delete):
+            current = read(key)
+            if current and current[0] != holder and current[2] > time.time():
+                return False
+            write(key, (holder, key + duration_min * 60, expires))
+            return True
+
+        return self._locked(apply)
+
+    def hold_many(self, starts: Iterable[str], holder: str, duration_min: int = 30, ttl: Optional[float] = None) -> List[str]:
+        """Holds what it can; returns the starts now held by `holder`."""
+        return [start for start in starts if self.hold(start, holder, duration_min, ttl)]
+
+    def consume(self, start: str, holder: str) -> bool:
+        """
+        Call right before creating the booking. True (and the hold is dropped) if the
+        slot is free or held by `holder`; False if another holder still has it.
+        """
+        key = slot_ts(start)
+
+        def apply(read, write, delete):
+            current = read(key)
+            if current and current[0] != holder and current[2] > time.time():
+                return False
+            delete(key)
+            return True
+
+        return self._locked(apply)
+
+    def release(self, start: str, holder: str):
+        key = slot_ts(start)
+
+        def apply(read, write, delete):
+            current = read(key)
+            if current and current[0] == holder:
+                delete(key)
+
+        self._locked(apply)
+
+    def held(self, exclude_holder: Optional[str] = None) -> List[Tuple[int, float]]:
+        """Live holds of everyone but `exclude_holder` as (start_ts, end_ts), sorted."""
+        return sorted((start, hold[1]) for start, hold in self._all() if hold[0] != exclude_holder)
+
+    def free(self, starts: Iterable[str], holder: Optional[str] = None, duration_min: int = 30) -> List[str]:
+        """The starts whose [start, start + duration) overlaps no one else's hold."""
+        holds = self.held(exclude_holder=holder)
+        result = []
+        for start in starts:
+            a = slot_ts(start)
+            b = a + duration_min * 60
+            if not any(hs < b and he > a for hs, he in holds):
+                result.append(start)
+        return result
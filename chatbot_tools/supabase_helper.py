@@ -1,6 +1,10 @@
 import os
 import requests
 from dotenv import load_dotenv
+try:
+    from chatbot_tools.phone_utils import normalize_phone
+except ImportError:
+    from phone_utils import normalize_phone
 
 load_dotenv()
 
@@ -16,8 +20,11 @@ def get_patient_by_phone(phone_number: str):
         print("⚠️ Supabase credentials not configured")
         return None
     
-    # Clean phone number (remove spaces, dashes)
-    clean_phone = phone_number.replace(" ", "").replace("-", "")
+    # Normalize to E.164 so the query matches how numbers are stored
+    clean_phone = normalize_phone(phone_number)
+    if not clean_phone:
+        print(f"👤 Not a valid phone number: {phone_number}")
+        return None
     
     url = f"{SUPABASE_URL}/rest/v1/patient"
     headers = {
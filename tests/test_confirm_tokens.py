@@ -0,0 +1,60 @@
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Arcigy_website", "backend"))
+from confirm_tokens import ConfirmTokens, InvalidToken  # noqa: E402
+
+FIELDS = {"action": "book", "time": "2026-10-19T08:00:00.000Z", "email": "jan@example.com",
+          "name": "Ján Novák", "phone": "+421919165630", "lang": "sk", "cid": "conv-1"}
+
+
+def test_round_trip():
+    tokens = ConfirmTokens("secret")
+    assert tokens.verify(tokens.issue(**FIELDS)) == FIELDS
+
+
+def test_missing_fields_are_null_and_unknown_ones_ignored():
+    tokens = ConfirmTokens("secret")
+    fields = tokens.verify(tokens.issue(action="cancel", email="jan@example.com", extra="x"))
+    assert fields["action"] == "cancel" and fields["time"] is None and "extra" not in fields
+
+
+def test_tampered_payload_is_rejected():
+    tokens = ConfirmTokens("secret")
+    other = tokens.issue(**dict(FIELDS, email="mallory@example.com"))
+    payload = other.split(".")[0]
+    signature = tokens.issue(**FIELDS).split(".")[1]
+    with pytest.raises(InvalidToken, match="signature"):
+        tokens.verify(f"{payload}.{signature}")
+
+
+def test_token_signed_with_another_secret_is_rejected():
+    with pytest.raises(InvalidToken):
+        ConfirmTokens("secret").verify(ConfirmTokens("other").issue(**FIELDS))
+
+
+@pytest.mark.parametrize("token", ["", "nodot", "a.b", "é.é", None])
+def test_malformed_tokens_are_rejected(token):
+    with pytest.raises(InvalidToken):
+        ConfirmTokens("secret").verify(token)
+
+
+def test_without_a_secret_nothing_is_issued_or_accepted():
+    tokens = ConfirmTokens(None)
+    assert not tokens.enabled
+    with pytest.raises(RuntimeError):
+        tokens.issue(**FIELDS)
+    with pytest.raises(InvalidToken):
+        tokens.verify(ConfirmTokens("secret").issue(**FIELDS))
+
+
+def test_expired_token_is_rejected(monkeypatch):
+    tokens = ConfirmTokens("secret", ttl=60)
+    token = tokens.issue(**FIELDS)
+    issued_at = time.time()
+    monkeypatch.setattr(time, "time", lambda: issued_at + 61)
+    with pytest.raises(InvalidToken, match="expired"):
+        tokens.verify(token)
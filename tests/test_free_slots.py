@@ -0,0 +1,58 @@
+import datetime
+from zoneinfo import ZoneInfo
+
+from chatbot_tools.free_slots import free_ranges, merge_intervals, parse_business_hours
+
+TZ = ZoneInfo("Europe/Bratislava")
+
+
+def local(*args):
+    return datetime.datetime(*args, tzinfo=TZ)
+
+
+def test_opening_hours_follow_the_autumn_dst_change():
+    # Summer time ends on Sunday 2026-10-25: 08:00 local is 06:00 UTC on Friday, 07:00 UTC on Monday
+    start = datetime.datetime(2026, 10, 23, tzinfo=datetime.timezone.utc)
+    ranges = free_ranges([], start, start + datetime.timedelta(days=4))
+    assert ranges == [
+        (local(2026, 10, 23, 8), local(2026, 10, 23, 18)),
+        (local(2026, 10, 26, 8), local(2026, 10, 26, 18)),
+    ]
+    assert [a.utcoffset() for a, _ in ranges] == [datetime.timedelta(hours=2), datetime.timedelta(hours=1)]
+    assert ranges[1][0].astimezone(datetime.timezone.utc).hour == 7
+
+
+def test_opening_hours_on_the_spring_dst_sunday():
+    # 2026-03-29 has only 23 hours; the open period is still 10 local hours
+    hours = parse_business_hours("0-6 08:00-18:00")
+    ranges = free_ranges([], local(2026, 3, 29, 0), local(2026, 3, 30, 0), hours=hours)
+    assert ranges == [(local(2026, 3, 29, 8), local(2026, 3, 29, 18))]
+    assert ranges[0][1] - ranges[0][0] == datetime.timedelta(hours=10)
+
+
+def test_busy_intervals_split_the_day_after_dst():
+    busy = [
+        (local(2026, 10, 26, 10).timestamp(), local(2026, 10, 26, 11).timestamp()),
+        (local(2026, 10, 26, 10, 30).timestamp(), local(2026, 10, 26, 12).timestamp()),
+    ]
+    ranges = free_ranges(busy, local(2026, 10, 26, 0), local(2026, 10, 27, 0))
+    assert ranges == [
+        (local(2026, 10, 26, 8), local(2026, 10, 26, 10)),
+        (local(2026, 10, 26, 12), local(2026, 10, 26, 18)),
+    ]
+
+
+def test_gaps_shorter_than_the_duration_after_rounding_are_dropped():
+    busy = [
+        (local(2026, 10, 26, 8).timestamp(), local(2026, 10, 26, 8, 50).timestamp()),
+        (local(2026, 10, 26, 9, 30).timestamp(), local(2026, 10, 26, 18).timestamp()),
+    ]
+    # 08:50-09:30 is 40 minutes, but a bookable start (09:00) leaves only 30
+    assert free_ranges(busy, local(2026, 10, 26, 0), local(2026, 10, 27, 0), duration_min=45) == []
+    assert free_ranges(busy, local(2026, 10, 26, 0), local(2026, 10, 27, 0), duration_min=30) == [
+        (local(2026, 10, 26, 9), local(2026, 10, 26, 9, 30)),
+    ]
+
+
+def test_merge_intervals():
+    assert merge_intervals([(5, 6), (1, 3), (2, 4), (4, 4.5)]) == [(1, 4.5), (5, 6)]
@@ -0,0 +1,62 @@
+import asyncio
+import threading
+import time
+
+from chatbot_tools.idempotency import IdempotencyStore, idempotency_key
+
+
+def test_key_ignores_case_and_whitespace():
+    assert idempotency_key("2026-10-19T08:00", " Jan@Example.com ") == idempotency_key("2026-10-19T08:00", "jan@example.com")
+    assert idempotency_key("a", "b") != idempotency_key("ab", "")
+
+
+def test_concurrent_runs_call_once_and_share_the_result():
+    store = IdempotencyStore()
+    calls = []
+    started = threading.Event()
+
+    def book():
+        calls.append(1)
+        started.set()
+        time.sleep(0.2)
+        return {"status": "success", "uid": "abc"}
+
+    results = []
+    first = threading.Thread(target=lambda: results.append(store.run("k", book)))
+    first.start()
+    started.wait(1)
+    others = [threading.Thread(target=lambda: results.append(store.run("k", book))) for _ in range(4)]
+    for t in others:
+        t.start()
+    for t in [first] + others:
+        t.join()
+
+    assert len(calls) == 1
+    assert [r["uid"] for r in results] == ["abc"] * 5
+    assert sum(1 for r in results if r.get("repeated")) == 4
+
+
+def test_errors_are_only_remembered_for_error_ttl():
+    store = IdempotencyStore(error_ttl=0.05)
+    assert store.run("k", lambda: {"status": "error", "message": "busy"})["status"] == "error"
+    assert store.run("k", lambda: {"status": "success"}) == {"status": "error", "message": "busy", "repeated": True}
+    time.sleep(0.1)
+    assert store.run("k", lambda: {"status": "success"}) == {"status": "success"}
+
+
+def test_arun_is_single_flight_within_the_loop():
+    store = IdempotencyStore()
+    calls = []
+
+    async def book():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"status": "success", "uid": "abc"}
+
+    async def main():
+        return await asyncio.gather(*(store.arun("k", book) for _ in range(3)))
+
+    results = asyncio.run(main())
+    assert len(calls) == 1
+    assert [r.get("repeated", False) for r in results] == [False, True, True]
+    assert store.get("k") == {"status": "success", "uid": "abc"}
@@ -0,0 +1,28 @@
+import pytest
+
+from chatbot_tools.phone_utils import normalize_phone
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ("+421919165630", "+421919165630"),
+    ("00421919165630", "+421919165630"),
+    ("0919 165 630", "+421919165630"),
+    ("919165630", "+421919165630"),
+    ("421919165630", "+421919165630"),
+    ("%2B421919165630", "+421919165630"),
+    (" 421919165630", "+421919165630"),
+    ("02 1234 5678", "+421212345678"),
+    ("+1 415 555 0100", "+14155550100"),
+    # Country code typed after the trunk "0"
+    ("0421919165630", "+421919165630"),
+])
+def test_normalizes_to_e164(raw, expected):
+    assert normalize_phone(raw) == expected
+
+
+@pytest.mark.parametrize("raw", [
+    None, "", "UNKNOWN", "null", "{from_number}",
+    "12345", "0919", "4219191656", "09191656301", "abc123456789",
+])
+def test_rejects_placeholders_and_junk(raw):
+    assert normalize_phone(raw) is None
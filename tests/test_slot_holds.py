@@ -0,0 +1,75 @@
+import time
+
+import pytest
+
+from chatbot_tools.slot_holds import SlotHolds, slot_ts, ts_iso
+
+SLOT = "2026-10-19T08:00:00.000Z"
+NEXT = "2026-10-19T08:30:00.000Z"
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def holds(request, tmp_path):
+    return SlotHolds(ttl=60, db_path=str(tmp_path / "holds.db") if request.param == "sqlite" else None)
+
+
+def test_slot_ts_accepts_the_formats_both_apps_send():
+    expected = slot_ts(SLOT)
+    assert slot_ts("2026-10-19T10:00:00+02:00") == expected
+    assert slot_ts("2026-10-19 08:00:00") == expected
+    assert ts_iso(expected) == SLOT
+
+
+def test_slot_ts_rejects_garbage():
+    with pytest.raises(ValueError):
+        slot_ts("tomorrow at nine")
+
+
+def test_hold_conflicts_with_another_holder(holds):
+    assert holds.hold(SLOT, "web:jan@example.com")
+    assert holds.hold(SLOT, "web:jan@example.com")  # extending our own hold
+    assert not holds.hold(SLOT, "call-1")
+    assert holds.hold(NEXT, "call-1")
+
+
+def test_consume_only_for_the_holder(holds):
+    holds.hold(SLOT, "call-1")
+    assert not holds.consume(SLOT, "call-2")
+    assert holds.consume(SLOT, "call-1")
+    # Consumed: the slot is free for anyone again
+    assert holds.consume(SLOT, "call-2")
+
+
+def test_release_ignores_other_holders(holds):
+    holds.hold(SLOT, "call-1")
+    holds.release(SLOT, "call-2")
+    assert not holds.hold(SLOT, "call-2")
+    holds.release(SLOT, "call-1")
+    assert holds.hold(SLOT, "call-2")
+
+
+def test_expired_holds_stop_counting(holds):
+    assert holds.hold(SLOT, "call-1", ttl=0.05)
+    time.sleep(0.1)
+    assert holds.held() == []
+    assert holds.hold(SLOT, "call-2")
+
+
+def test_free_hides_overlapping_holds_of_others(holds):
+    holds.hold(SLOT, "call-1", duration_min=60)
+    assert holds.free([SLOT, NEXT, "2026-10-19T09:00:00.000Z"]) == ["2026-10-19T09:00:00.000Z"]
+    assert holds.free([SLOT, NEXT], holder="call-1") == [SLOT, NEXT]
+    assert holds.held(exclude_holder="call-2") == [(slot_ts(SLOT), slot_ts(SLOT) + 3600)]
+
+
+def test_hold_many_returns_what_was_held(holds):
+    holds.hold(NEXT, "call-1")
+    assert holds.hold_many([SLOT, NEXT], "call-2") == [SLOT]
+
+
+def test_sqlite_holds_are_shared_between_instances(tmp_path):
+    path = str(tmp_path / "holds.db")
+    web, voice = SlotHolds(db_path=path), SlotHolds(db_path=path)
+    assert web.hold(SLOT, "web:jan@example.com")
+    assert not voice.hold(SLOT, "call-1")
+    assert not voice.consume(SLOT, "call-1")